@@ -0,0 +1,254 @@
+"""
+Benchmark harness for the E-Pass work expense analyzer.
+
+Generates synthetic statements in the same format as real E-Pass exports and times
+each stage of the analyzer separately, reporting throughput and peak memory as JSON.
+Statements small enough for the standard-library fast path are first checked to give
+the same totals, report and output files on both paths:
+
+    python benchmark_epass.py --sizes 1000 100000 1000000 --output bench.json
+    python benchmark_epass.py --sizes 1000 100000 --compare bench.json
+"""
+import argparse
+import contextlib
+import filecmp
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+import epass_work_expense_analyzer as analyzer
+
+TRANSPONDERS = ['3857335', '3857335', '3857335', '4012876']
+LOCATIONS = ['CONWAY MAIN PLAZA', 'BEACHLINE MAIN PLAZA', 'JOHN YOUNG PKWY', 'CURRY FORD WEST',
+             'HIAWASSEE MAIN PLAZA', 'DEAN ROAD', 'BOGGY CREEK', 'FOREST LAKE MAIN PLAZA']
+TOLL_AMOUNTS = ['0.50', '0.75', '1.03', '1.25', '1.31', '1.56', '2.06', '2.75']
+TOLL_TYPES = ['E', 'E', 'E', 'V']
+SEPARATOR_ROW = ','.join(['"---------"'] * 7) + '\n'
+
+def generate_statement(path, rows, start=date(2025, 1, 1), rows_per_day=4, seed=0):
+    """
+    Write a synthetic statement with `rows` vehicle transactions starting at `start`.
+    Includes the Account Activity section, dashed separator rows, %d-%b-%y dates and
+    transactions on every day of the period, so weekends and holidays are covered.
+    """
+    rng = random.Random(seed)
+    with open(path, 'w', buffering=1024 * 1024) as file:
+        file.write(f"{analyzer.ACCOUNT_SECTION}\n")
+        file.write("Date,Description,Amount\n")
+        file.write(f'"{start:%d-%b-%y}","Auto Replenishment","-40.00"\n')
+        file.write(','.join(['"---------"'] * 3) + '\n')
+        file.write("\n")
+        file.write(f"{analyzer.VEHICLE_SECTION}\n")
+        file.write(analyzer.VEHICLE_HEADER + "\n")
+        file.write(SEPARATOR_ROW)
+
+        day = start
+        written = 0
+        lines = []
+        while written < rows:
+            posting = day + timedelta(days=1)
+            for _ in range(min(rows_per_day, rows - written)):
+                seconds = rng.randrange(86400)
+                lines.append(
+                    f'"{rng.choice(TRANSPONDERS)}","{day:%d-%b-%y}",'
+                    f'"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}",'
+                    f'"{posting:%d-%b-%y}","{rng.choice(LOCATIONS)}","{rng.choice(TOLL_AMOUNTS)}",'
+                    f'"{rng.choice(TOLL_TYPES)}"\n')
+                written += 1
+            if len(lines) >= 10000:
+                file.writelines(lines)
+                lines = []
+            day += timedelta(days=1)
+        file.writelines(lines)
+    return path
+
+def generate_batch(directory, rows, files=12, seed=0):
+    """Split `rows` transactions over `files` monthly statements named month_2025.csv."""
+    paths = []
+    for month in range(1, files + 1):
+        path = os.path.join(directory, f"{month:02d}_2025.csv")
+        start = date(2025 + (month - 1) // 12, (month - 1) % 12 + 1, 1)
+        paths.append(generate_statement(path, max(1, rows // files), start=start, seed=seed + month))
+    return paths
+
+def _measure(func, repeat, memory, setup=None):
+    """
+    Run func silently; return the best wall time of `repeat` runs and the peak traced memory.
+    `setup` runs untimed before every call.
+    """
+    best = None
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(repeat):
+            if setup:
+                setup()
+            started = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        peak = None
+        if memory:
+            if setup:
+                setup()
+            tracemalloc.start()
+            try:
+                func()
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+    return best, peak
+
+def _output_files(directory):
+    """Relative paths of the files under directory, skipping statements."""
+    paths = []
+    for root, _, files in os.walk(directory):
+        paths.extend(os.path.relpath(os.path.join(root, name), directory) for name in files)
+    return sorted(path for path in paths if path.startswith(('expensable_', 'receipt_', 'summary_', 'transponders_')))
+
+def check_fast_path_parity(statement, workdir):
+    """
+    Analyze a statement through the standard-library fast path and the pandas path, each in its
+    own directory, and raise AssertionError unless the totals, reports and output files agree.
+    """
+    results = {}
+    for fast_path in (True, False):
+        directory = os.path.join(workdir, 'fast' if fast_path else 'pandas')
+        os.makedirs(directory)
+        shutil.copy(statement, directory)
+        cwd = os.getcwd()
+        os.chdir(directory)
+        try:
+            report = io.StringIO()
+            with contextlib.redirect_stdout(report):
+                total = analyzer.analyze_tool_expenses(os.path.basename(statement), streaming=False,
+                                                       fast_path=fast_path)
+        finally:
+            os.chdir(cwd)
+        results[fast_path] = (directory, total, report.getvalue())
+
+    (fast_dir, fast_total, fast_report), (pandas_dir, pandas_total, pandas_report) = results[True], results[False]
+    assert fast_total == pandas_total, f"totals differ: {fast_total} != {pandas_total}"
+    assert fast_report == pandas_report, "reports differ"
+    files = _output_files(pandas_dir)
+    assert files == _output_files(fast_dir), "output file sets differ"
+    _, mismatch, errors = filecmp.cmpfiles(pandas_dir, fast_dir, files, shallow=False)
+    assert not mismatch and not errors, f"output files differ: {mismatch + errors}"
+    shutil.rmtree(fast_dir)
+    shutil.rmtree(pandas_dir)
+
+def benchmark_size(rows, workdir, repeat=1, memory=True, workers=None):
+    """Time every analyzer stage on a statement of `rows` transactions."""
+    statement = generate_statement(os.path.join(workdir, 'bench_2025.csv'), rows)
+    receipt = f"receipt_{os.path.basename(statement)}"
+
+    stages = [
+        ('read_csv', lambda: analyzer.read_csv(statement)),
+        ('analyze_tool_expenses', lambda: analyzer.analyze_tool_expenses(statement, streaming=False,
+                                                                         fast_path=False)),
+        ('analyze_tool_expenses_streaming', lambda: analyzer.analyze_tool_expenses_streaming(statement)),
+        ('filter_receipt_file', lambda: analyzer.filter_receipt_file(statement)),
+    ]
+    if os.path.getsize(statement) <= analyzer.FAST_PATH_MAX_BYTES:
+        check_fast_path_parity(statement, workdir)
+        stages.append(('analyze_small_statement', lambda: analyzer.analyze_small_statement(statement)))
+    results = []
+    for stage, func in stages:
+        seconds, peak = _measure(func, repeat, memory)
+        results.append(_result(stage, rows, seconds, peak))
+
+    # Each run needs a fresh receipt without a total row
+    seconds, peak = _measure(lambda: analyzer.add_total_to_receipt_file(receipt), repeat, memory,
+                             setup=lambda: analyzer.filter_receipt_file(statement))
+    results.append(_result('add_total_to_receipt_file', rows, seconds, peak))
+
+    os.remove(statement)
+    batch_dir = os.path.join(workdir, 'batch')
+    os.makedirs(batch_dir)
+    generate_batch(batch_dir, rows)
+    cwd = os.getcwd()
+    os.chdir(batch_dir)
+    try:
+        seconds, peak = _measure(lambda: analyzer.process_all_files(workers=workers, use_cache=False),
+                                 repeat, memory)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(batch_dir)
+    results.append(_result('process_all_files', rows, seconds, peak))
+    return results
+
+def _result(stage, rows, seconds, peak):
+    return {
+        'stage': stage,
+        'rows': rows,
+        'seconds': round(seconds, 6),
+        'rows_per_second': round(rows / seconds, 1) if seconds else None,
+        'peak_memory_bytes': peak,
+    }
+
+def compare_results(previous, current):
+    """Print the speed ratio of each stage and size against a previous results file."""
+    baseline = {(r['stage'], r['rows']): r for r in previous['results']}
+    print(f"\n{'stage':<34}{'rows':>10}{'before s':>12}{'after s':>12}{'speedup':>10}")
+    for result in current['results']:
+        before = baseline.get((result['stage'], result['rows']))
+        if before is None:
+            continue
+        speedup = before['seconds'] / result['seconds'] if result['seconds'] else float('inf')
+        print(f"{result['stage']:<34}{result['rows']:>10}{before['seconds']:>12.4f}"
+              f"{result['seconds']:>12.4f}{speedup:>9.2f}x")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the E-Pass work expense analyzer.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help="statement sizes in vehicle rows")
+    parser.add_argument('--repeat', type=int, default=1, help="timed runs per stage (best is kept)")
+    parser.add_argument('--workers', type=int, default=None, help="process_all_files worker count")
+    parser.add_argument('--no-memory', action='store_true', help="skip the peak memory measurement")
+    parser.add_argument('--output', default='bench_results.json', help="JSON results file")
+    parser.add_argument('--compare', help="previous JSON results file to compare against")
+    parser.add_argument('--label', default='', help="free-form label stored with the results")
+    args = parser.parse_args(argv)
+
+    report = {
+        'label': args.label,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'rules_version': analyzer.RULES_VERSION,
+        'results': [],
+    }
+    for rows in args.sizes:
+        with tempfile.TemporaryDirectory() as workdir:
+            cwd = os.getcwd()
+            os.chdir(workdir)
+            try:
+                results = benchmark_size(rows, workdir, args.repeat, not args.no_memory, args.workers)
+            finally:
+                os.chdir(cwd)
+        for result in results:
+            memory = result['peak_memory_bytes']
+            memory_text = f"{memory / 1024 / 1024:9.1f} MB" if memory is not None else ''
+            print(f"{result['stage']:<34}{rows:>10} rows {result['seconds']:>10.4f}s "
+                  f"{result['rows_per_second'] or 0:>14,.0f} rows/s {memory_text}")
+        report['results'].extend(results)
+
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r') as file:
+            compare_results(json.load(file), report)
+    return report
+
+if __name__ == "__main__":
+    main()
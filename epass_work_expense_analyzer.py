@@ -1,118 +1,235 @@
-import pandas as pd
+import argparse
 from datetime import datetime, timedelta
+import bisect
 import calendar
+import collections
+import csv
+import functools
+import hashlib
+import importlib
+import json
+import mmap
 import os
-from io import StringIO
+from io import BytesIO, StringIO
 import glob
+import html
+import queue
 import re
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, redirect_stdout
 
-def filter_receipt_file(input_file_path):
+ACCOUNT_SECTION = "Account Activity"
+VEHICLE_SECTION = "Vehicle Activity"
+VEHICLE_HEADER = "Transponder Number,Date,Time,Posting Date,Location,Amount,Toll Type"
+
+class _LazyModule:
+    """
+    Stands in for a module and imports it on first use, so runs that never need pandas
+    (the small-statement fast path, the CLI's help) do not pay for importing it.
+    """
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+    
+    def __getattr__(self, attribute):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attribute)
+
+pd = _LazyModule('pandas')
+np = _LazyModule('numpy')
+
+try:
+    # Optional: lets watch mode wake up on file events instead of polling
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:
+    INotify = None
+
+# 0 = quiet, 1 = debug messages, 2 = also DataFrame samples
+VERBOSITY = int(os.environ.get('EPASS_VERBOSITY', '0'))
+# JSON-lines file that receives a metrics record per statement and per batch
+METRICS_LOG = os.environ.get('EPASS_METRICS_LOG') or None
+
+def configure_instrumentation(verbosity=None, metrics_log=None):
+    """Set the debug verbosity and the JSON-lines metrics log (None leaves a setting unchanged)."""
+    global VERBOSITY, METRICS_LOG
+    if verbosity is not None:
+        VERBOSITY = verbosity
+    if metrics_log is not None:
+        METRICS_LOG = metrics_log or None
+
+def debug(message, level=1):
+    """Print a diagnostic message when the verbosity asks for it."""
+    if VERBOSITY >= level:
+        print(message)
+
+class StatementMetrics:
+    """
+    Wall time, rows in/out and bytes read/written for each processing stage of a statement.
+    Repeated stages (e.g. one per streaming chunk) are accumulated under the same name.
+    """
+    COUNTERS = ('rows_in', 'rows_out', 'bytes_read', 'bytes_written')
+    
+    def __init__(self, file_path, kind='file'):
+        self.file_path = file_path
+        self.kind = kind
+        self.stages = {}
+    
+    def record(self, name, seconds, **counts):
+        stage = self.stages.setdefault(name, {'stage': name, 'seconds': 0.0})
+        stage['seconds'] += seconds
+        for counter in self.COUNTERS:
+            if counts.get(counter) is not None:
+                stage[counter] = stage.get(counter, 0) + int(counts[counter])
+    
+    def to_dict(self):
+        stages = [dict(stage, seconds=round(stage['seconds'], 6)) for stage in self.stages.values()]
+        return {
+            'kind': self.kind,
+            'file': self.file_path,
+            'total_seconds': round(sum(stage['seconds'] for stage in self.stages.values()), 6),
+            'stages': stages,
+        }
+    
+    @classmethod
+    def aggregate(cls, records, label='batch'):
+        """Merge per-file metrics records into one batch record."""
+        batch = cls(label, kind='batch')
+        for record in records:
+            for stage in record['stages']:
+                batch.record(stage['stage'], stage['seconds'],
+                             **{counter: stage.get(counter) for counter in cls.COUNTERS})
+        result = batch.to_dict()
+        result['files'] = len(records)
+        return result
+
+@contextmanager
+def _timed(metrics, name):
+    """Time a stage; the caller fills the yielded dict with rows_in/rows_out/bytes_read/bytes_written."""
+    counts = {}
+    started = time.perf_counter()
+    try:
+        yield counts
+    finally:
+        if metrics is not None:
+            metrics.record(name, time.perf_counter() - started, **counts)
+
+def emit_metrics(record):
+    """Append a metrics record to METRICS_LOG and print it when verbose."""
+    line = json.dumps(record)
+    if METRICS_LOG:
+        with open(METRICS_LOG, 'a') as file:
+            file.write(line + '\n')
+    debug(f"Metrics: {line}")
+
+def write_text(path, text, mode='w'):
+    """Write (or with mode 'a', append) text to an output file straight away."""
+    with open(path, mode) as file:
+        file.write(text)
+
+# Statements parsed ahead, and output files waiting to be written, in a pipelined batch run
+PIPELINE_QUEUE_SIZE = 2
+
+class BackgroundWriter:
+    """
+    A drop-in for write_text that writes output files on a background thread, in submission order.
+    The queue is bounded, so callers wait when the disk falls behind instead of buffering
+    every pending output in memory. close() waits for the queue to drain.
+    """
+    def __init__(self, queue_size=PIPELINE_QUEUE_SIZE):
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.errors = []
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+    
+    def __call__(self, path, text, mode='w'):
+        self.queue.put((path, text, mode))
+    
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            path, text, mode = item
+            try:
+                write_text(path, text, mode)
+            except Exception as e:
+                self.errors.append(f"Error writing {path}: {str(e)}")
+    
+    def close(self):
+        """Flush every queued write and report any failures."""
+        self.queue.put(None)
+        self.thread.join()
+        for error in self.errors:
+            print(error)
+
+def prefetch_statements(file_paths, queue_size=PIPELINE_QUEUE_SIZE):
+    """
+    Yield (file_path, statement, metrics) for each file while a reader thread parses the next ones.
+    Statements too large for memory are not parsed ahead (statement is None) and get streamed instead,
+    nor are those small enough for the fast path, which reads them faster than pandas parses them.
+    """
+    parsed = queue.Queue(maxsize=queue_size)
+    
+    def read():
+        for file_path in file_paths:
+            metrics = StatementMetrics(file_path)
+            statement = None
+            try:
+                size = os.path.getsize(file_path)
+                fast_path = VERBOSITY == 0 and size <= FAST_PATH_MAX_BYTES
+                if not fast_path and size <= STREAMING_THRESHOLD_BYTES:
+                    statement = parse_statement(file_path, metrics)
+            except OSError:
+                pass  # analyze_tool_expenses reports the unreadable file
+            parsed.put((file_path, statement, metrics))
+    
+    reader = threading.Thread(target=read, daemon=True)
+    reader.start()
+    for _ in file_paths:
+        yield parsed.get()
+    reader.join()
+
+def filter_receipt_file(input_file_path, statement=None, metrics=None, expensable=None, write=None):
     """
     Filter a receipt file to keep only Account Activity and work-hour vehicle activities.
-    Applies the same business logic as expensable analysis: weekdays 7:30AM-8PM, excluding holidays.
+    Applies the same expense rules as expensable analysis (by default weekdays 7:30AM-8PM, excluding holidays).
     Creates a new filtered file with the same name but prefixed with 'receipt_'.
-    Adds a total row for the vehicle activities.
+    Adds a total row for the vehicle activities of every transponder on the account.
+    Pass an already parsed statement (and its expensable mask) to avoid reading and classifying again.
+    The receipt is written through `write` (see write_text).
     """
     try:
         print(f"\nFiltering receipt file: {input_file_path}")
         
-        # Read the entire file as text
-        with open(input_file_path, 'r') as file:
-            lines = file.readlines()
-        
-        # Find Account Activity section
-        account_start = None
-        vehicle_start = None
-        
-        for i, line in enumerate(lines):
-            if line.strip() == "Account Activity":
-                account_start = i
-            elif line.strip() == "Vehicle Activity":
-                vehicle_start = i
-                break
+        if statement is None:
+            statement = parse_statement(input_file_path, metrics)
         
-        if account_start is None or vehicle_start is None:
+        if statement is None or statement.account_lines is None or statement.vehicle_header_lines is None:
             print("Could not find Account Activity or Vehicle Activity sections")
             return None
         
-        # Extract Account Activity section (including header and data)
-        account_lines = []
-        for i in range(account_start, vehicle_start):
-            account_lines.append(lines[i])
+        df = statement.df
         
-        # Extract Vehicle Activity header
-        vehicle_header = lines[vehicle_start]
-        vehicle_header_line = lines[vehicle_start + 1]  # The actual CSV header
-        
-        # Get holidays for filtering
-        from datetime import datetime
-        year = 2025  # Default year, will be updated from data
-        holiday_names = get_us_holidays(year)
-        
-        # Extract and filter vehicle activities using business logic
-        filtered_vehicle_lines = [vehicle_header, vehicle_header_line]
-        total_amount = 0.0
-        
-        for i in range(vehicle_start + 2, len(lines)):
-            line = lines[i].strip()
-            if not line:  # Empty line
-                continue
+        with _timed(metrics, 'receipt_filter') as stage:
+            # Classify every vehicle row in one pass
+            if expensable is None:
+                expensable = get_expensable_mask(df)
+            receipt_mask = expensable
             
-            # Only process lines that start with transponder number
-            if not line.startswith('"3857335"'):
-                continue
+            total_amount = cents_to_dollars(df.loc[receipt_mask, 'Amount'].sum())
+            filtered_content = _receipt_text(statement, receipt_mask)
             
-            try:
-                # Parse the line to extract date, time, and amount
-                parts = line.split(',')
-                if len(parts) < 6:
-                    continue
-                
-                # Extract date and time
-                date_str = parts[1].strip('"')
-                time_str = parts[2].strip('"')
-                amount_str = parts[5].strip('"')
-                
-                # Parse date and time
-                date_obj = pd.to_datetime(date_str, format='%d-%b-%y')
-                time_obj = pd.to_datetime(time_str, format='%H:%M:%S').time()
-                
-                # Check if it's a workday (Monday=0, Sunday=6)
-                weekday = date_obj.weekday()
-                is_weekday = weekday < 5  # Monday to Friday
-                
-                # Check if it's during work hours (7:30 AM to 8:00 PM)
-                from datetime import time
-                is_work_hours = time(7, 30) <= time_obj <= time(20, 0)
-                
-                # Check if it's a holiday
-                date_str_for_holiday = date_obj.strftime('%Y-%m-%d')
-                is_holiday = date_str_for_holiday in holiday_names.index
-                
-                # Check if it's Christmas
-                is_christmas = (date_obj.month == 12) and (date_obj.day == 25)
-                
-                # Include only workday, work-hour, non-holiday transactions
-                if is_weekday and is_work_hours and not is_holiday and not is_christmas:
-                    filtered_vehicle_lines.append(lines[i])
-                    amount = float(amount_str)
-                    total_amount += amount
-                    
-            except (ValueError, IndexError, pd.errors.ParserError):
-                # If we can't parse the line, skip it
-                continue
-        
-        # Add total row
-        total_line = f'"TOTAL","","","","TOTAL WORK-HOUR VEHICLE ACTIVITIES","{total_amount:.2f}",""\n'
-        filtered_vehicle_lines.append(total_line)
-        
-        # Create the filtered content
-        filtered_content = ''.join(account_lines) + '\n' + ''.join(filtered_vehicle_lines)
-        
-        # Save the filtered file
-        output_file = f"receipt_{os.path.basename(input_file_path)}"
-        with open(output_file, 'w') as file:
-            file.write(filtered_content)
+            # Save the filtered file
+            output_file = f"receipt_{os.path.basename(input_file_path)}"
+            (write or write_text)(output_file, filtered_content)
+            stage['rows_in'] = len(df)
+            stage['rows_out'] = int(receipt_mask.sum())
+            stage['bytes_written'] = len(filtered_content.encode())
         
         print(f"Filtered receipt saved to: {output_file}")
         print(f"Total work-hour vehicle activities amount: ${total_amount:.2f}")
@@ -122,250 +239,1480 @@ def filter_receipt_file(input_file_path):
         print(f"Error filtering receipt file: {str(e)}")
         return None
 
-def add_total_to_receipt_file(receipt_file_path):
+def _receipt_text(statement, expensable):
+    """
+    Receipt content: the Account Activity section and the original raw lines of the
+    expensable vehicle rows, closed by a total row.
+    """
+    df = statement.df
+    filtered_vehicle_lines = list(statement.vehicle_header_lines)
+    filtered_vehicle_lines.extend(statement.vehicle_lines[i] for i in df.index[expensable])
+    filtered_vehicle_lines.append(_receipt_total_line(df.loc[expensable, 'Amount'].sum()))
+    return ''.join(statement.account_lines) + '\n' + ''.join(filtered_vehicle_lines)
+
+RECEIPT_TOTAL_MARKER = 'TOTAL VEHICLE ACTIVITIES'
+RECEIPT_TAIL_BYTES = 4096
+
+def _parse_total_line(line):
+    """Return the amount of a receipt total row, or None if it cannot be parsed."""
+    parts = line.split(',')
+    if len(parts) < 6:
+        return None
+    try:
+        return float(parts[5].strip().strip('"'))
+    except ValueError:
+        return None
+
+def read_receipt_tail(receipt_file_path, tail_bytes=RECEIPT_TAIL_BYTES):
+    """
+    Seek to the end of a receipt and return (total, ends_with_newline).
+    Totals are only ever appended, so the vehicle total row is always in the tail;
+    total is None when the receipt has none yet.
+    """
+    with open(receipt_file_path, 'rb') as file:
+        file.seek(0, os.SEEK_END)
+        size = file.tell()
+        file.seek(max(0, size - tail_bytes))
+        tail = file.read().decode('utf-8', errors='replace')
+    ends_with_newline = not tail or tail.endswith('\n')
+    for line in reversed(tail.splitlines()):
+        if RECEIPT_TOTAL_MARKER in line:
+            return _parse_total_line(line), ends_with_newline
+    return None, ends_with_newline
+
+def add_total_to_receipt_file(receipt_file_path, return_total=False):
     """
     Add a total row to an existing receipt file.
+    The receipt is scanned once and the total row appended in place. Returns the file
+    path, or the total amount when return_total is set (batch mode).
     """
     try:
         print(f"\nAdding total to receipt file: {receipt_file_path}")
         
-        # Read the entire file as text
-        with open(receipt_file_path, 'r') as file:
-            lines = file.readlines()
-        
-        # Find Vehicle Activity section
-        vehicle_start = None
-        for i, line in enumerate(lines):
-            if line.strip() == "Vehicle Activity":
-                vehicle_start = i
-                break
-        
-        if vehicle_start is None:
-            print("Could not find Vehicle Activity section")
-            return None
-        
         # Check if total already exists
-        has_total = any('TOTAL VEHICLE ACTIVITIES' in line for line in lines)
-        if has_total:
+        existing_total, ends_with_newline = read_receipt_tail(receipt_file_path)
+        if existing_total is not None:
             print("Total already exists in the file")
-            return receipt_file_path
-        
-        # Calculate total from existing vehicle activities
-        total_amount = 0.0
-        for i in range(vehicle_start + 2, len(lines)):
-            line = lines[i].strip()
-            if not line or 'TOTAL' in line:
-                continue
-            
-            # Include ALL vehicle activities (both with and without "E" in Toll Type)
-            if line.startswith('"3857335"'):
+            return existing_total if return_total else receipt_file_path
+        
+        # Calculate total from vehicle activities in exact cents, in a single scan
+        total_cents = 0
+        in_vehicle_section = False
+        with open(receipt_file_path, 'r', newline='') as file:
+            for line in file:
+                if line.strip() == "Vehicle Activity":
+                    in_vehicle_section = True
+                    break
+            # Parse the rows as CSV, so a quoted comma in the location does not shift the amount
+            for parts in csv.reader(file):
+                if not parts or parts[0].strip() == 'TOTAL':
+                    continue
+                
+                # Include ALL vehicle activities of every transponder (both with and without "E" in Toll Type)
                 try:
-                    # Split by comma and get the amount (second to last field)
-                    parts = line.split(',')
-                    if len(parts) >= 6:  # Ensure we have enough parts
-                        amount_str = parts[5].strip('"')
-                        amount = float(amount_str)
-                        total_amount += amount
-                except (ValueError, IndexError):
-                    # If we can't parse the amount, continue without adding to total
+                    if len(parts) >= 6:  # Ensure we have enough fields
+                        total_cents += round(float(parts[5].strip()) * 100)
+                except ValueError:
+                    # The column header and any unparseable amount are not added to the total
                     pass
         
-        # Add total row at the end
-        total_line = f'"TOTAL","","","","TOTAL VEHICLE ACTIVITIES","{total_amount:.2f}",""\n'
+        if not in_vehicle_section:
+            print("Could not find Vehicle Activity section")
+            return None
         
-        # Write back to file
-        with open(receipt_file_path, 'w') as file:
-            file.writelines(lines)
+        # Append the total row at the end
+        total_amount = cents_to_dollars(total_cents)
+        total_line = f'"TOTAL","","","","{RECEIPT_TOTAL_MARKER}","{total_amount:.2f}",""\n'
+        with open(receipt_file_path, 'a') as file:
+            if not ends_with_newline:
+                file.write('\n')
             file.write(total_line)
         
         print(f"Total added to receipt file: ${total_amount:.2f}")
-        return receipt_file_path
+        return total_amount if return_total else receipt_file_path
         
     except Exception as e:
         print(f"Error adding total to receipt file: {str(e)}")
         return None
 
-def get_us_holidays(year):
-    """Generate US Federal Holidays for a given year with their names."""
-    holidays = {
+def _nth_weekday(year, month, weekday, n):
+    """Day of the month of the n-th given weekday (Monday=0), or the last one when n is -1."""
+    if n > 0:
+        return 1 + (weekday - datetime(year, month, 1).weekday()) % 7 + 7 * (n - 1)
+    last_day = calendar.monthrange(year, month)[1]
+    return last_day - (datetime(year, month, last_day).weekday() - weekday) % 7
+
+def _us_holiday_dates(year):
+    """US Federal Holidays of a year as a dict of 'YYYY-MM-DD' -> name."""
+    return {
         f"{year}-01-01": "New Year's Day",
-        f"{year}-01-{1 + (20 - datetime(year, 1, 1).weekday()) % 7}": "Martin Luther King Jr. Day",
-        f"{year}-02-{1 + (20 - datetime(year, 2, 1).weekday()) % 7}": "Presidents Day",
-        f"{year}-05-{1 + (31 - datetime(year, 5, 31).weekday())}": "Memorial Day",
+        f"{year}-01-{_nth_weekday(year, 1, 0, 3):02d}": "Martin Luther King Jr. Day",
+        f"{year}-02-{_nth_weekday(year, 2, 0, 3):02d}": "Presidents Day",
+        f"{year}-05-{_nth_weekday(year, 5, 0, -1):02d}": "Memorial Day",
         f"{year}-06-19": "Juneteenth",
         f"{year}-07-04": "Independence Day",
-        f"{year}-09-{1 + (7 - datetime(year, 9, 1).weekday()) % 7}": "Labor Day",
-        f"{year}-10-{1 + (13 - datetime(year, 10, 1).weekday()) % 7}": "Columbus Day",
+        f"{year}-09-{_nth_weekday(year, 9, 0, 1):02d}": "Labor Day",
+        f"{year}-10-{_nth_weekday(year, 10, 0, 2):02d}": "Columbus Day",
         f"{year}-11-11": "Veterans Day",
-        f"{year}-11-{22 + (3 - datetime(year, 11, 22).weekday()) % 7}": "Thanksgiving Day",
+        f"{year}-11-{_nth_weekday(year, 11, 3, 4):02d}": "Thanksgiving Day",
         f"{year}-12-25": "Christmas Day"
     }
+
+def get_us_holidays(year):
+    """Generate US Federal Holidays for a given year with their names."""
     # Convert to series for easier lookup
-    return pd.Series(holidays)
+    return pd.Series(_us_holiday_dates(year))
 
-def analyze_tool_expenses(file_path):
-    try:
-        df = read_csv(file_path)
-        if df is None:
-            return 0
+EPOCH = datetime(1970, 1, 1)
+
+def _date_day(text):
+    """Day number (days since 1970-01-01) of a 'YYYY-MM-DD' date."""
+    return (datetime.strptime(str(text), '%Y-%m-%d') - EPOCH).days
+
+@functools.lru_cache(maxsize=None)
+def _holiday_days(year):
+    """Memoized (day number, name) pairs of the US Federal Holidays in a year, days counted from 1970-01-01."""
+    return tuple((_date_day(date), name) for date, name in _us_holiday_dates(year).items())
+
+def _day_numbers(dates):
+    """Convert a datetime Series to integer day numbers (days since 1970-01-01)."""
+    return dates.to_numpy().astype('datetime64[D]').astype('int64')
+
+class HolidayCalendar:
+    """
+    US Federal Holidays for every year present in the data, plus any custom holidays
+    (a dict of day number -> name). Set federal to False to keep only the custom ones,
+    or christmas to False to leave Christmas Day out of the federal holidays.
+    Holidays are kept as a sorted array of integer day numbers so a whole column
+    is checked with a single searchsorted instead of formatting every date.
+    """
+    def __init__(self, years, custom=None, federal=True, christmas=True):
+        self.names = {}
+        if federal:
+            for year in sorted({int(year) for year in years}):
+                self.names.update(_holiday_days(year))
+                if not christmas:
+                    del self.names[_date_day(f"{year}-12-25")]
+        self.names.update(custom or {})
+        self.day_list = sorted(self.names)
+    
+    @functools.cached_property
+    def days(self):
+        """The holiday day numbers as a sorted int64 array."""
+        return np.array(self.day_list, dtype='int64')
+    
+    def is_holiday(self, dates):
+        """Boolean Series marking the dates that fall on a holiday."""
+        day_numbers = _day_numbers(dates)
+        positions = np.searchsorted(self.days, day_numbers).clip(max=max(len(self.days) - 1, 0))
+        hits = self.days[positions] == day_numbers if len(self.days) else np.zeros(len(dates), dtype=bool)
+        return pd.Series(hits, index=dates.index)
+    
+    def name(self, date):
+        """Name of the holiday on a date, or None."""
+        return self.names.get(int(np.datetime64(date, 'D').astype('int64')))
+    
+    def items(self):
+        """(date, name) pairs in date order."""
+        for day in self.days:
+            yield np.datetime64(int(day), 'D'), self.names[int(day)]
+
+DAY_NAMES = list(calendar.day_name)
+
+def cents_to_dollars(cents):
+    """Convert an exact integer amount of cents to dollars for display and output."""
+    return int(cents) / 100
+
+def _expensable_csv_rows(records):
+    """
+    expensable_ CSV data lines (no header) for (transponder, 'YYYY-MM-DD', seconds since midnight,
+    posting date, location, cents, toll type, weekday) records: Time as HH:MM:SS, Amount in
+    dollars, plus the day_name and date_str columns. Both the pandas path and the fast path
+    write their rows through here.
+    """
+    output = StringIO()
+    csv.writer(output, lineterminator='\n').writerows(
+        [transponder, f"{date} 00:00:00", _time_text(seconds), posting_date, location, cents / 100, toll_type,
+         weekday, DAY_NAMES[weekday], date]
+        for transponder, date, seconds, posting_date, location, cents, toll_type, weekday in records)
+    return output.getvalue()
+
+def _text_values(column):
+    """A text column as a list, missing values as '' (as to_csv writes them)."""
+    return column.astype(object).where(column.notna(), '').tolist()
+
+def _expensable_frame_csv(work_hours):
+    """expensable_ CSV data lines (no header) for classified vehicle rows (see _expensable_csv_rows)."""
+    return _expensable_csv_rows(zip(
+        _text_values(work_hours['Transponder Number']), work_hours['Date'].dt.strftime('%Y-%m-%d').tolist(),
+        work_hours['Time'].tolist(), _text_values(work_hours['Posting Date']), _text_values(work_hours['Location']),
+        work_hours['Amount'].tolist(), _text_values(work_hours['Toll Type']), work_hours['weekday'].tolist()))
+
+# Rules file read from the working directory when present (see ExpenseRules)
+RULES_FILE = os.environ.get('EPASS_RULES', 'epass_rules.json')
+
+# Weekdays 7:30AM-8PM, excluding US Federal Holidays and Christmas
+DEFAULT_RULES = {
+    'windows': {day: ['07:30', '20:00'] for day in DAY_NAMES[:5]},
+    'federal_holidays': True,
+    'christmas': True,
+    'holidays': {},
+    'exceptions': [],
+    'transponders': {},
+}
+PROFILE_KEYS = ('windows', 'federal_holidays', 'christmas', 'holidays', 'exceptions')
+
+def _seconds_of_day(text):
+    """Parse 'HH:MM' or 'HH:MM:SS' into seconds since midnight."""
+    parts = [int(part) for part in str(text).split(':')]
+    if len(parts) not in (2, 3) or not 0 <= parts[0] <= 24 or not all(0 <= part < 60 for part in parts[1:]):
+        raise ValueError(f"Invalid time of day: {text}")
+    return parts[0] * 3600 + parts[1] * 60 + (parts[2] if len(parts) == 3 else 0)
+
+def _clock_text(seconds):
+    """Seconds since midnight as a 12-hour clock time: 27000 -> '7:30AM', 72000 -> '8PM'."""
+    hours, minutes, seconds = seconds // 3600, seconds // 60 % 60, seconds % 60
+    suffix = 'AM' if hours < 12 or hours == 24 else 'PM'
+    text = str(hours % 12 or 12)
+    if minutes or seconds:
+        text += f":{minutes:02d}"
+    if seconds:
+        text += f":{seconds:02d}"
+    return text + suffix
+
+def _window_text(window):
+    """A (start, end) window in seconds as '7:30AM-8PM'."""
+    return f"{_clock_text(window[0])}-{_clock_text(window[1])}"
+
+def _weekday_windows(windows):
+    """Normalize the weekday names of a windows setting ('monday' -> 'Monday')."""
+    return {day.capitalize(): window for day, window in windows.items()}
+
+def _rule_keys(profiles, days):
+    """Combine profile ids and day numbers (scalars or int64 arrays) into one sortable key."""
+    return profiles * (1 << 32) + days + (1 << 31)
+
+def _interval_set(intervals):
+    """Merge (first key, last key) intervals into sorted, non-overlapping start and end lists."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [start for start, _ in merged], [end for _, end in merged]
+
+def _in_intervals(keys, starts, ends):
+    """Boolean array marking the keys that fall inside one of the intervals."""
+    if not starts:
+        return np.zeros(len(keys), dtype=bool)
+    starts = np.array(starts, dtype='int64')
+    ends = np.array(ends, dtype='int64')
+    positions = np.searchsorted(starts, keys, side='right') - 1
+    return (positions >= 0) & (keys <= ends[positions.clip(min=0)])
+
+def _in_interval_list(key, starts, ends):
+    """Whether a single key falls inside one of the intervals."""
+    position = bisect.bisect_right(starts, key) - 1
+    return position >= 0 and key <= ends[position]
+
+class ExpenseRules:
+    """
+    Configurable expensability rules, loaded from a JSON file or given as a dict:
+    
+        windows          per-weekday [start, end] time windows (inclusive), replacing the
+                         default window of the listed days; a day set to null is not expensable
+        federal_holidays exclude US Federal Holidays (default true)
+        christmas        exclude Christmas Day every year (default true)
+        holidays         custom holidays, {"YYYY-MM-DD" or "MM-DD" (every year): name}
+        exceptions       date ranges, [{"start", "end", "expensable", "reason"}]; ranges with
+                         expensable false (PTO) exclude every transaction, ranges with
+                         expensable true (travel weeks) make every transaction expensable
+        transponders     per-transponder overrides of any of the keys above; listed windows
+                         replace the default ones, holidays and exceptions are added
+    
+    Missing keys take their values from DEFAULT_RULES.
+    """
+    def __init__(self, config=None):
+        config = dict(config or {})
+        unknown = set(config) - set(DEFAULT_RULES)
+        if unknown:
+            raise ValueError(f"Unknown rule settings: {', '.join(sorted(unknown))}")
+        self.config = {key: config.get(key, value) for key, value in DEFAULT_RULES.items()}
+        self.config['windows'] = dict(_weekday_windows(DEFAULT_RULES['windows']),
+                                      **_weekday_windows(self.config['windows']))
+        self.profiles = [self._profile(self.config)]
+        self.transponders = {}
+        for transponder, override in sorted(self.config['transponders'].items()):
+            unknown = set(override) - set(PROFILE_KEYS)
+            if unknown:
+                raise ValueError(f"Unknown rule settings for transponder {transponder}: {', '.join(sorted(unknown))}")
+            merged = {key: self.config[key] for key in PROFILE_KEYS}
+            merged['windows'] = dict(self.config['windows'], **_weekday_windows(override.get('windows', {})))
+            merged['holidays'] = dict(self.config['holidays'], **override.get('holidays', {}))
+            merged['exceptions'] = list(self.config['exceptions']) + list(override.get('exceptions', []))
+            for key in ('federal_holidays', 'christmas'):
+                merged[key] = override.get(key, self.config[key])
+            self.transponders[str(transponder)] = len(self.profiles)
+            self.profiles.append(self._profile(merged))
+        self._compiled = {}
+    
+    @classmethod
+    def load(cls, path):
+        """Read rules from a JSON file."""
+        with open(path, 'r') as file:
+            return cls(json.load(file))
+    
+    @staticmethod
+    def _profile(config):
+        """Validate one set of rules and convert its times and dates to numbers."""
+        windows = [None] * 7
+        for day, window in config['windows'].items():
+            if day not in DAY_NAMES:
+                raise ValueError(f"Unknown weekday in rules: {day}")
+            if window is not None:
+                start, end = (_seconds_of_day(time) for time in window)
+                if end < start:
+                    raise ValueError(f"Window of {day} ends before it starts: {window}")
+                windows[DAY_NAMES.index(day)] = (start, end)
+        exceptions = []
+        for exception in config['exceptions']:
+            start = _date_day(exception['start'])
+            end = _date_day(exception.get('end', exception['start']))
+            if end < start:
+                raise ValueError(f"Exception ends before it starts: {exception}")
+            exceptions.append((start, end, bool(exception.get('expensable', False))))
+        for date in config['holidays']:
+            # Recurring MM-DD holidays are checked against a leap year, so 02-29 is allowed
+            try:
+                _date_day(f"2000-{date}" if len(str(date)) == 5 else date)
+            except ValueError:
+                raise ValueError(f"Invalid holiday date in rules: {date}") from None
+        return {
+            'windows': windows,
+            'federal_holidays': bool(config['federal_holidays']),
+            'christmas': bool(config['christmas']),
+            'holidays': {str(date): name for date, name in config['holidays'].items()},
+            'exceptions': exceptions,
+        }
+    
+    def window_label(self):
+        """
+        The default time windows in words for report headings, e.g. 'Workdays 7:30AM-8PM'
+        or 'Mon-Thu 7:30AM-8PM, Fri 7:30AM-1PM, Sat 9AM-12PM'.
+        """
+        windows = self.profiles[0]['windows']
+        if windows[5] is None and windows[6] is None and windows[0] is not None and len(set(windows[:5])) == 1:
+            return f"Workdays {_window_text(windows[0])}"
+        runs = []
+        for weekday, window in enumerate(windows):
+            if window is None:
+                continue
+            if runs and runs[-1][1] == weekday - 1 and runs[-1][2] == window:
+                runs[-1][1] = weekday
+            else:
+                runs.append([weekday, weekday, window])
+        if not runs:
+            return "no expensable hours"
+        return ', '.join(f"{DAY_NAMES[first][:3]}{'-' + DAY_NAMES[last][:3] if last > first else ''} {_window_text(window)}"
+                         for first, last, window in runs)
+    
+    def fingerprint(self):
+        """Short hash of the rule configuration."""
+        return hashlib.sha256(json.dumps(self.config, sort_keys=True).encode()).hexdigest()[:16]
+    
+    def compile(self, years):
+        """Compile the rules for the given years into lookup arrays (memoized per set of years)."""
+        years = tuple(sorted({int(year) for year in years}))
+        if years not in self._compiled:
+            self._compiled[years] = CompiledRules(self, years)
+        return self._compiled[years]
+    
+    def compile_for(self, dates):
+        """Compile the rules for every year in a datetime Series."""
+        return self.compile(dates.dt.year.dropna().unique())
+    
+    def mask(self, df):
+        """Boolean Series marking the expensable transactions of a cleaned vehicle DataFrame."""
+        return self.compile_for(df['Date']).mask(df)
+
+class CompiledRules:
+    """
+    ExpenseRules compiled for a set of years into lookup tables: window start and end
+    seconds indexed by [profile, weekday] and two sets of (profile, day) key intervals,
+    one for excluded days (holidays, PTO) and one for forced expensable days (travel).
+    Classifying a DataFrame takes the same handful of array operations however many
+    rules, holidays, exceptions and transponder overrides are configured.
+    The tables are plain lists so single transactions can be classified without numpy.
+    """
+    def __init__(self, rules, years):
+        self.transponders = rules.transponders
+        self.window_label = rules.window_label()
+        self.window_starts = [[1] * 7 for _ in rules.profiles]
+        self.window_ends = [[0] * 7 for _ in rules.profiles]
+        excluded = []
+        included = []
+        self.holiday_calendars = []
+        for profile, config in enumerate(rules.profiles):
+            for weekday, window in enumerate(config['windows']):
+                if window is not None:
+                    self.window_starts[profile][weekday], self.window_ends[profile][weekday] = window
             
-        # Add day names and weekday indicator
-        df['weekday'] = df['Date'].dt.dayofweek  # Monday=0, Sunday=6
-        df['day_name'] = df['Date'].dt.day_name()
-        
-        # Get the year from the data
-        year = df['Date'].dt.year.iloc[0]
-        
-        # Get holidays for the year in the data
-        holiday_names = get_us_holidays(year)
-        
-        # Convert dates to string format for comparison
-        df['date_str'] = df['Date'].dt.strftime('%Y-%m-%d')
+            custom = {}
+            for year in years:
+                if config['christmas']:
+                    custom[_date_day(f"{year}-12-25")] = "Christmas Day"
+                for date, name in config['holidays'].items():
+                    if len(date) == 5:  # MM-DD recurs every year
+                        if date == '02-29' and not calendar.isleap(year):
+                            continue
+                        custom[_date_day(f"{year}-{date}")] = name
+            custom.update((_date_day(date), name) for date, name in config['holidays'].items() if len(date) != 5)
+            holidays = HolidayCalendar(years, custom, federal=config['federal_holidays'],
+                                       christmas=config['christmas'])
+            self.holiday_calendars.append(holidays)
+            
+            excluded.extend((key, key) for key in (_rule_keys(profile, day) for day in holidays.day_list))
+            for start, end, expensable in config['exceptions']:
+                interval = (_rule_keys(profile, start), _rule_keys(profile, end))
+                (included if expensable else excluded).append(interval)
+        self.excluded = _interval_set(excluded)
+        self.included = _interval_set(included)
+    
+    @property
+    def holiday_calendar(self):
+        """Holidays of the default rules, used to name holidays in reports."""
+        return self.holiday_calendars[0]
+    
+    def profile_ids(self, transponders):
+        """Rule profile of every row: 0 for the default rules, else its transponder override."""
+        if not self.transponders:
+            return np.zeros(len(transponders), dtype='intp')
+        if not isinstance(transponders.dtype, pd.CategoricalDtype):
+            transponders = transponders.astype('category')
+        # One lookup per category; missing transponders (code -1) take the trailing default
+        lookup = [self.transponders.get(str(category), 0) for category in transponders.cat.categories]
+        return np.array(lookup + [0], dtype='intp')[transponders.cat.codes.to_numpy()]
+    
+    def mask(self, df):
+        """Boolean Series marking the expensable transactions of a cleaned vehicle DataFrame."""
+        profiles = self.profile_ids(df['Transponder Number'])
+        weekdays = df['Date'].dt.dayofweek.to_numpy()
+        seconds = df['Time'].to_numpy()
+        window_starts = np.array(self.window_starts, dtype='int64')
+        window_ends = np.array(self.window_ends, dtype='int64')
+        in_window = (seconds >= window_starts[profiles, weekdays]) & (seconds <= window_ends[profiles, weekdays])
+        keys = _rule_keys(profiles.astype('int64'), _day_numbers(df['Date']))
+        expensable = (in_window & ~_in_intervals(keys, *self.excluded)) | _in_intervals(keys, *self.included)
+        return pd.Series(expensable, index=df.index)
+    
+    def is_expensable(self, transponder, day, weekday, seconds):
+        """Classify one transaction (day number, weekday, seconds since midnight) in plain Python."""
+        profile = self.transponders.get(transponder, 0)
+        key = _rule_keys(profile, day)
+        if _in_interval_list(key, *self.included):
+            return True
+        if _in_interval_list(key, *self.excluded):
+            return False
+        return self.window_starts[profile][weekday] <= seconds <= self.window_ends[profile][weekday]
+
+_expense_rules = None
+
+def get_expense_rules():
+    """The active rules: set by configure_rules(), else read from RULES_FILE if present, else the defaults."""
+    global _expense_rules
+    if _expense_rules is None:
+        _expense_rules = ExpenseRules.load(RULES_FILE) if os.path.exists(RULES_FILE) else ExpenseRules()
+    return _expense_rules
+
+def configure_rules(rules=None, path=None):
+    """Set the active rules from an ExpenseRules, a config dict or a JSON file (None resets to the default lookup)."""
+    global _expense_rules
+    if path is not None:
+        rules = ExpenseRules.load(path)
+    elif rules is not None and not isinstance(rules, ExpenseRules):
+        rules = ExpenseRules(rules)
+    _expense_rules = rules
+
+def get_expensable_mask(df, rules=None):
+    """
+    Classify every transaction at once with the compiled expense rules (the active rules by default).
+    By default a transaction is expensable on weekdays between 7:30AM and 8PM, excluding holidays and Christmas.
+    """
+    return (rules or get_expense_rules()).mask(df)
+
+def get_report_period(file_path):
+    """Get the report month name and year from a month_year.csv filename."""
+    month_year = os.path.splitext(os.path.basename(file_path))[0]
+    try:
+        month, year = month_year.split('_')
+        month_name = calendar.month_name[int(month)]
+    except (ValueError, IndexError):
+        # If filename doesn't match expected pattern, use a generic name
+        month_name = "Unknown"
+        year = "Unknown"
+    return month_name, year
+
+EXPENSABLE_COLUMNS = VEHICLE_HEADER.split(',') + ['weekday', 'day_name', 'date_str']
+EXPENSABLE_CSV_HEADER = ','.join(EXPENSABLE_COLUMNS) + '\n'
+
+def _expensable_total_line(total_cents):
+    """The TOTAL row closing an expensable_ CSV."""
+    return f"TOTAL,,,,,{cents_to_dollars(total_cents)!r},,,,\n"
+
+def _receipt_total_line(total_cents):
+    """The TOTAL row closing a filtered receipt."""
+    return f'"TOTAL","","","","TOTAL WORK-HOUR VEHICLE ACTIVITIES","{cents_to_dollars(total_cents):.2f}",""\n'
+
+def transponder_directory(file_path):
+    """Directory holding the per-transponder outputs of a statement."""
+    return f"transponders_{os.path.splitext(os.path.basename(file_path))[0]}"
+
+class TransponderOutputs:
+    """
+    Per-transponder expensable CSVs and receipts of one statement, written to
+    transponders_<statement>/expensable_<transponder>.csv and receipt_<transponder>.csv.
+    Rows are partitioned with a single groupby on the categorical transponder column and
+    may be added in several batches (one per streaming chunk); close() appends the totals.
+    Files are written through `write` (see write_text), under output_dir if given.
+    """
+    def __init__(self, file_path, account_lines=None, vehicle_header_lines=None, write=None, output_dir=''):
+        self.directory = os.path.join(output_dir, transponder_directory(file_path))
+        self.write = write or write_text
+        self.receipt_prefix = None
+        if account_lines is not None and vehicle_header_lines is not None:
+            self.receipt_prefix = ''.join(account_lines) + '\n' + ''.join(vehicle_header_lines)
+        self.totals = {}  # transponder -> [expensable cents, expensable count]
+        self.bytes_written = 0
+    
+    def _path(self, kind, transponder):
+        return os.path.join(self.directory, f"{kind}_{transponder}.csv")
+    
+    def add(self, df, expensable, receipt_text):
+        """
+        Append a batch of classified rows. Every transponder seen gets its files, even without
+        expensable rows. receipt_text(index) returns the raw receipt lines of the given rows.
+        """
+        for transponder, rows in df.assign(_expensable=expensable).groupby('Transponder Number', observed=True):
+            work_hours = rows[rows['_expensable']].drop(columns='_expensable')
+            self.add_transponder(transponder, _expensable_frame_csv(work_hours),
+                                 receipt_text(work_hours.index), int(work_hours['Amount'].sum()), len(work_hours))
+    
+    def add_transponder(self, transponder, expensable_csv, receipt_text, cents, count):
+        """Append one transponder's expensable rows (CSV text without the header) and raw receipt lines."""
+        os.makedirs(self.directory, exist_ok=True)
+        is_new = transponder not in self.totals
+        totals = self.totals.setdefault(transponder, [0, 0])
+        totals[0] += cents
+        totals[1] += count
+        
+        mode = 'w' if is_new else 'a'
+        self._write('expensable', transponder, (EXPENSABLE_CSV_HEADER if is_new else '') + expensable_csv, mode)
+        if self.receipt_prefix is not None:
+            self._write('receipt', transponder, (self.receipt_prefix if is_new else '') + receipt_text, mode)
+    
+    def _write(self, kind, transponder, text, mode):
+        self.write(self._path(kind, transponder), text, mode)
+        self.bytes_written += len(text.encode())
+    
+    def close(self):
+        """Append the total rows and return (transponder, cents, count) for every transponder, in order."""
+        for transponder, (cents, _) in sorted(self.totals.items()):
+            self._write('expensable', transponder, _expensable_total_line(cents), 'a')
+            if self.receipt_prefix is not None:
+                self._write('receipt', transponder, _receipt_total_line(cents), 'a')
+        return [(transponder, cents, count) for transponder, (cents, count) in sorted(self.totals.items())]
+
+def summary_file(file_path):
+    """Path of the StatementSummary persisted for a statement."""
+    return f"summary_{os.path.splitext(os.path.basename(file_path))[0]}.json"
+
+class StatementSummary:
+    """
+    Mergeable aggregates of one statement, or of several merged into a period: expensable
+    cents and count per weekday, per location and per transponder, the set of expensable
+    dates, and the non-expensable cents and count. Merging adds the counters and unions the
+    dates, so a period report never touches raw rows and still counts distinct expensable
+    days (and the average per day) correctly.
+    Persisted next to a statement's outputs as summary_<statement>.json (see summary_file),
+    with the content hash of the statement it summarizes (see with_statement_hash).
+    """
+    def __init__(self, file_path=None):
+        self.files = [file_path] if file_path else []
+        self.statement_hash = None  # SHA-256 of the summarized statement file, if known
+        self.daily = [[0, 0] for _ in range(7)]  # [cents, count] for Monday to Sunday
+        self.locations = {}  # location -> [cents, count]
+        self.transponders = {}  # transponder -> [cents, count], including transponders without expensable rows
+        self.expensable_dates = set()  # 'YYYY-MM-DD'
+        self.non_expensable = [0, 0]
+    
+    @classmethod
+    def from_frame(cls, df, expensable, file_path=None):
+        """Summarize a cleaned vehicle DataFrame and its expensable mask with a few groupbys."""
+        summary = cls(file_path)
+        work_hours = df[expensable]
+        daily = (work_hours.groupby(work_hours['Date'].dt.dayofweek)['Amount'].agg(['sum', 'count'])
+                 .reindex(range(7), fill_value=0))
+        summary.daily = [[int(cents), int(count)] for cents, count in zip(daily['sum'], daily['count'])]
+        locations = work_hours.groupby('Location', observed=True)['Amount'].agg(['sum', 'count'])
+        summary.locations = {location: [int(cents), int(count)] for location, cents, count
+                             in zip(locations.index.astype(str), locations['sum'], locations['count'])}
+        transponders = (df[['Transponder Number']].assign(cents=df['Amount'].where(expensable, 0), count=expensable)
+                        .groupby('Transponder Number', observed=True)[['cents', 'count']].sum())
+        summary.transponders = {transponder: [int(cents), int(count)] for transponder, cents, count
+                                in zip(transponders.index.astype(str), transponders['cents'], transponders['count'])}
+        summary.expensable_dates = set(work_hours['Date'].dt.normalize().drop_duplicates().dt.strftime('%Y-%m-%d'))
+        summary.non_expensable = [int(df.loc[~expensable, 'Amount'].sum()), int((~expensable).sum())]
+        return summary
+    
+    @classmethod
+    def from_transactions(cls, transactions, file_path=None):
+        """
+        Summarize (weekday, 'YYYY-MM-DD', location, transponder, cents, expensable) records one at
+        a time (see add_transaction), for statements that are not held in a DataFrame.
+        """
+        summary = cls(file_path)
+        for transaction in transactions:
+            summary.add_transaction(*transaction)
+        return summary
+    
+    def add_transaction(self, weekday, date, location, transponder, cents, expensable):
+        """Count one transaction; date is 'YYYY-MM-DD'."""
+        if not expensable:
+            self.transponders.setdefault(transponder, [0, 0])
+            self.non_expensable[0] += cents
+            self.non_expensable[1] += 1
+            return
+        for totals in (self.daily[weekday], self.locations.setdefault(location, [0, 0]),
+                       self.transponders.setdefault(transponder, [0, 0])):
+            totals[0] += cents
+            totals[1] += 1
+        self.expensable_dates.add(date)
+    
+    def merge(self, other):
+        """Add another summary's aggregates into this one; returns self."""
+        self.files.extend(other.files)
+        for totals, other_totals in zip(self.daily, other.daily):
+            totals[0] += other_totals[0]
+            totals[1] += other_totals[1]
+        for mine, theirs in ((self.locations, other.locations), (self.transponders, other.transponders)):
+            for key, (cents, count) in theirs.items():
+                totals = mine.setdefault(key, [0, 0])
+                totals[0] += cents
+                totals[1] += count
+        self.expensable_dates |= other.expensable_dates
+        self.non_expensable[0] += other.non_expensable[0]
+        self.non_expensable[1] += other.non_expensable[1]
+        return self
+    
+    def remove_duplicates(self, duplicates, keys):
+        """
+        Take the transactions counted in `duplicates` (a Counter of dedup keys, see
+        DedupIndex.duplicate_keys) off the expensable totals; keys are all of the statement's
+        expensable keys, from which the remaining expensable dates are recounted. Non-expensable
+        totals are left as they are: the index only keys expensable transactions. Returns self.
+        """
+        for key, repeated in duplicates.items():
+            transponder, date, _, rest = key.split(',', 3)
+            location, cents = rest.rsplit(',', 1)
+            weekday = datetime.strptime(date, '%Y-%m-%d').weekday()
+            for totals in (self.daily[weekday], self.locations[location], self.transponders[transponder]):
+                totals[0] -= repeated * int(cents)
+                totals[1] -= repeated
+        remaining = collections.Counter(keys) - duplicates
+        self.locations = {location: totals for location, totals in self.locations.items() if totals[1]}
+        self.expensable_dates = {key.split(',', 2)[1] for key in remaining}
+        return self
+    
+    def with_statement_hash(self, file_path):
+        """Record the content hash of the statement file summarized; returns self."""
+        self.statement_hash = _file_hash(file_path)
+        return self
+    
+    @property
+    def total_cents(self):
+        return sum(cents for cents, _ in self.daily)
+    
+    def to_dict(self):
+        return {
+            'files': self.files,
+            'statement_hash': self.statement_hash,
+            'daily': self.daily,
+            'locations': dict(sorted(self.locations.items())),
+            'transponders': dict(sorted(self.transponders.items())),
+            'expensable_dates': sorted(self.expensable_dates),
+            'non_expensable': self.non_expensable,
+        }
+    
+    @classmethod
+    def from_dict(cls, record):
+        summary = cls()
+        summary.files = list(record['files'])
+        summary.statement_hash = record.get('statement_hash')
+        summary.daily = [list(totals) for totals in record['daily']]
+        summary.locations = {key: list(totals) for key, totals in record['locations'].items()}
+        summary.transponders = {key: list(totals) for key, totals in record['transponders'].items()}
+        summary.expensable_dates = set(record['expensable_dates'])
+        summary.non_expensable = list(record['non_expensable'])
+        return summary
+    
+    def to_json(self):
+        return json.dumps(self.to_dict()) + '\n'
+    
+    @classmethod
+    def load(cls, path):
+        """Read a persisted summary."""
+        with open(path, 'r') as file:
+            return cls.from_dict(json.load(file))
+    
+    def render_report(self, title, fmt='text'):
+        """Render the summary-only expense report, with per-location and per-transponder roll-ups."""
+        return render_expense_report(
+            title, self.daily, len(self.expensable_dates), self.non_expensable[0], self.non_expensable[1],
+            transponder_totals=[(key, cents, count) for key, (cents, count) in sorted(self.transponders.items())],
+            location_totals=[(key, cents, count) for key, (cents, count) in sorted(self.locations.items())],
+            fmt=fmt)
+
+class ExpenseAnalysis:
+    """
+    The result of analyzing one statement in memory (see analyze_statement).
+    expensable and non_expensable hold the classified rows of the cleaned vehicle DataFrame
+    (Amount in integer cents, Time in seconds since midnight). daily_summary has the
+    expensable cents and count of every weekday, holiday_hits the cents and count of the
+    transactions on each holiday, and transponder_totals (transponder, cents, count) for
+    every transponder on the account.
+    Nothing is printed or written: write_outputs() and render_report() are separate steps.
+    """
+    def __init__(self, statement, mask, rules):
+        self.statement = statement
+        self.name = statement.file_path
+        self.mask = mask
+        self.holiday_calendar = rules.holiday_calendar
+        self.window_label = rules.window_label
+        df = statement.df
+        self.expensable = df[mask]
+        self.non_expensable = df[~mask]
+        
+        daily = self.expensable.groupby('weekday')['Amount'].agg(['sum', 'count']).reindex(range(7), fill_value=0)
+        self.daily_summary = pd.DataFrame({'day_name': DAY_NAMES, 'cents': daily['sum'].astype('int64'),
+                                           'count': daily['count'].astype('int64')})
+        self.total_cents = int(self.daily_summary['cents'].sum())
+        self.non_expensable_cents = int(self.non_expensable['Amount'].sum())
+        self.expensable_days = len(np.unique(_day_numbers(self.expensable['Date'])))
+        
+        by_transponder = (df[['Transponder Number']].assign(cents=df['Amount'].where(mask, 0), count=mask)
+                          .groupby('Transponder Number', observed=True)[['cents', 'count']].sum())
+        self.transponder_totals = sorted(zip(by_transponder.index.astype(str), by_transponder['cents'].astype(int),
+                                             by_transponder['count'].astype(int)))
+        
+        names = pd.Series(_day_numbers(df['Date']), index=df.index).map(self.holiday_calendar.names)
+        on_holiday = df[names.notna()]
+        self.holiday_hits = (on_holiday.assign(date=on_holiday['Date'], holiday=names[names.notna()])
+                             .groupby(['date', 'holiday'])['Amount'].agg(cents='sum', count='count').reset_index())
+    
+    @property
+    def total(self):
+        """Total expensable amount in dollars."""
+        return cents_to_dollars(self.total_cents)
+    
+    @property
+    def daily_totals(self):
+        """(cents, count) of the expensable transactions for Monday to Sunday."""
+        return list(zip(self.daily_summary['cents'].tolist(), self.daily_summary['count'].tolist()))
+    
+    def summary(self, name=None):
+        """The mergeable StatementSummary of this statement (recorded under `name` if given)."""
+        return StatementSummary.from_frame(self.statement.df, self.mask, name or self.name)
+    
+    def expensable_keys(self):
+        """Dedup keys of the expensable transactions (see transaction_keys)."""
+        return transaction_keys(self.expensable)
+    
+    def expensable_csv(self):
+        """The expensable_ CSV text: the expensable rows and a total row."""
+        return EXPENSABLE_CSV_HEADER + _expensable_frame_csv(self.expensable) + _expensable_total_line(self.total_cents)
+    
+    def receipt_text(self):
+        """The receipt_ file text, or None when the statement has no Account Activity section."""
+        if self.statement.account_lines is None or self.statement.vehicle_header_lines is None:
+            return None
+        return _receipt_text(self.statement, self.mask)
+    
+    def write_transponder_outputs(self, file_path, write=None, output_dir=''):
+        """Write the per-transponder expensable CSVs and receipts; returns the TransponderOutputs."""
+        statement = self.statement
+        outputs = TransponderOutputs(file_path, statement.account_lines, statement.vehicle_header_lines, write,
+                                     output_dir)
+        outputs.add(statement.df, self.mask, lambda index: ''.join(statement.vehicle_lines[i] for i in index))
+        outputs.close()
+        return outputs
+    
+    def write_outputs(self, directory='.', name=None, write=None):
+        """
+        Write the expensable_ CSV, the receipt_ file, the per-transponder files and the
+        statement summary into directory,
+        named after `name` (by default the statement's file name). Returns the written paths by kind.
+        """
+        name = name or self.name
+        if name is None:
+            raise ValueError("A statement name is needed to name its output files")
+        write = write or write_text
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.basename(name)
+        paths = {'expensable': os.path.join(directory, f"expensable_{base}")}
+        write(paths['expensable'], self.expensable_csv())
+        receipt = self.receipt_text()
+        if receipt is not None:
+            paths['receipt'] = os.path.join(directory, f"receipt_{base}")
+            write(paths['receipt'], receipt)
+        paths['transponders'] = self.write_transponder_outputs(name, write, directory).directory
+        paths['summary'] = os.path.join(directory, summary_file(name))
+        write(paths['summary'], self.summary(name).to_json())
+        return paths
+    
+    def render_report(self, fmt='text', summary_only=False):
+        """Render the expense report as text, Markdown or HTML (see render_expense_report)."""
+        month_name, year = get_report_period(self.name or '')
+        return render_expense_report(
+            f"Toll Expense Report for {month_name} {year}", self.daily_totals, self.expensable_days,
+            self.non_expensable_cents, len(self.non_expensable),
+            expensable=None if summary_only else self.expensable,
+            non_expensable=None if summary_only else self.non_expensable,
+            holiday_calendar=self.holiday_calendar, transponder_totals=self.transponder_totals, fmt=fmt,
+            window_label=self.window_label)
+
+def classify_statement(statement, rules=None, metrics=None):
+    """Classify a ParsedStatement with the expense rules (the active rules by default) into an ExpenseAnalysis."""
+    if rules is not None and not isinstance(rules, ExpenseRules):
+        rules = ExpenseRules(rules)
+    df = statement.df
+    with _timed(metrics, 'classification') as stage:
+        stage['rows_in'] = len(df)
+        # Add weekday indicator; day names are only derived when rendering
+        df['weekday'] = df['Date'].dt.dayofweek.astype('int8')  # Monday=0, Sunday=6
+        
+        # Compile the expense rules, and their holidays, for every year in the data
+        compiled = (rules or get_expense_rules()).compile_for(df['Date'])
+        holiday_calendar = compiled.holiday_calendar
         
         # Debug print to verify holiday dates
-        print("\nDebug - Holiday dates:")
-        for date, name in holiday_names.items():
-            print(f"{date}: {name}")
-        
-        # Identify Christmas and holidays
-        is_christmas = (df['Date'].dt.month == 12) & (df['Date'].dt.day == 25)
-        is_holiday = df['date_str'].isin(holiday_names.index)
-        
-        # Debug print to verify holiday detection
-        print("\nDebug - Detected holidays in data:")
-        holiday_dates = df[is_holiday]['date_str'].unique()
-        for date in holiday_dates:
-            print(f"Found holiday: {date} - {holiday_names.get(date, 'Unknown')}")
+        if VERBOSITY >= 1:
+            debug("\nDebug - Holiday dates:")
+            for date, name in holiday_calendar.items():
+                debug(f"{date}: {name}")
+            
+            # Debug print to verify holiday detection
+            debug("\nDebug - Detected holidays in data:")
+            is_holiday = holiday_calendar.is_holiday(df['Date'])
+            holiday_dates = df.loc[is_holiday, 'Date'].dt.strftime('%Y-%m-%d').unique()
+            for date in holiday_dates:
+                debug(f"Found holiday: {date} - {holiday_calendar.name(date) or 'Unknown'}")
         
         # Separate transactions into expensable and non-expensable
-        work_days = df[
-            (df['weekday'].between(0, 4)) &  # Monday to Friday
-            (~is_christmas) &  # not Christmas
-            (~is_holiday)  # not a bank holiday
-        ]
-        from datetime import time
-        work_hours = work_days[work_days['Time'].between(time(7, 30), time(20, 0))]
-        
-        
-        # Calculate total amount
-        total_amount = work_hours['Amount'].sum()
-        
-        # Create a total row
-        total_row = pd.DataFrame([{
-            'Transponder Number': 'TOTAL',
-            'Date': '',
-            'Time': '',
-            'Posting Date': '',
-            'Location': '',
-            'Amount': total_amount,
-            'Toll Type': '',
-            'weekday': '',
-            'day_name': '',
-            'date_str': ''
-        }])
-        
-        # Concatenate the work_hours DataFrame with the total row
-        work_hours_with_total = pd.concat([work_hours, total_row], ignore_index=True)
+        analysis = ExpenseAnalysis(statement, compiled.mask(df), compiled)
+        stage['rows_out'] = len(analysis.expensable)
+    return analysis
+
+def analyze_statement(source, name=None, rules=None, metrics=None):
+    """
+    Analyze a statement given as a path, bytes or a file-like object entirely in memory,
+    without printing or writing anything. `name` (e.g. '01_2025.csv') names the report
+    period and the output files of a statement read from bytes; `rules` overrides the
+    active expense rules with an ExpenseRules or a config dict.
+    Returns an ExpenseAnalysis; raises ValueError if the statement has no Vehicle Activity header.
+    """
+    return classify_statement(_parse_statement(source, metrics, name), rules, metrics)
+
+def analyze_tool_expenses(file_path, streaming=None, metrics=None, report_path=None,
+                          report_format=None, summary_only=False, statement=None, write=None, fast_path=None,
+                          keys=None):
+    """
+    Analyze a statement, write the expensable_ CSV and receipt_ files and render the report.
+    The report goes to stdout, or to report_path as text, Markdown (.md) or HTML (.html);
+    summary_only skips the per-transaction listings.
+    Statements larger than STREAMING_THRESHOLD_BYTES are processed in streaming mode
+    unless streaming is set explicitly.
+    Per-stage metrics are recorded into `metrics` (a new StatementMetrics if not given) and emitted.
+    An already parsed `statement` skips reading the file, and output files go through
+    `write` (e.g. a BackgroundWriter) instead of being written directly.
+    Statements up to FAST_PATH_MAX_BYTES go through the standard-library fast path
+    (analyze_small_statement) unless fast_path is False.
+    A `keys` list receives the dedup keys of the expensable transactions (see transaction_keys).
+    Returns the total expensable amount.
+    """
+    if metrics is None:
+        metrics = StatementMetrics(file_path)
+    if streaming is None:
+        streaming = os.path.exists(file_path) and os.path.getsize(file_path) > STREAMING_THRESHOLD_BYTES
+    if streaming:
+        return analyze_tool_expenses_streaming(file_path, metrics=metrics, report_path=report_path,
+                                               report_format=report_format, keys=keys)
+    if fast_path is None:
+        fast_path = (statement is None and VERBOSITY == 0 and os.path.exists(file_path)
+                     and os.path.getsize(file_path) <= FAST_PATH_MAX_BYTES)
+    if fast_path:
+        total = analyze_small_statement(file_path, metrics, report_path, report_format, summary_only, write, keys)
+        if total is not None:
+            return total
+    if write is None:
+        write = write_text
+    try:
+        if statement is None:
+            statement = parse_statement(file_path, metrics)
+        if statement is None:
+            return 0
+        analysis = classify_statement(statement, metrics=metrics)
+        if keys is not None:
+            keys.extend(analysis.expensable_keys())
         
         # Save expensable transactions with total to a new CSV file (retaining all fields)
         expensable_file_path = f"expensable_{os.path.basename(file_path)}"
-        work_hours_with_total.to_csv(expensable_file_path, index=False)
+        with _timed(metrics, 'csv_write') as stage:
+            expensable_csv = analysis.expensable_csv()
+            write(expensable_file_path, expensable_csv)
+            stage['rows_out'] = len(analysis.expensable) + 1
+            stage['bytes_written'] = len(expensable_csv.encode())
         print(f"Expensable transactions saved to {expensable_file_path}")
         
         # Automatically create filtered receipt file with Account Activity and only expendable vehicle activities
-        filtered_receipt_path = filter_receipt_file(file_path)
+        filtered_receipt_path = filter_receipt_file(file_path, statement, metrics, analysis.mask, write)
         if filtered_receipt_path:
             print(f"Filtered receipt with Account Activity and expendable vehicle activities saved to {filtered_receipt_path}")
         
-        # Calculate expensable_days before using it
-        expensable_days = len(work_hours['Date'].dt.date.unique())
+        # Per-transponder expensable CSVs and receipts, partitioned in one pass
+        with _timed(metrics, 'transponder_split') as stage:
+            outputs = analysis.write_transponder_outputs(file_path, write)
+            stage['rows_in'] = len(statement.df)
+            stage['bytes_written'] = outputs.bytes_written
+        print(f"Per-transponder files for {len(analysis.transponder_totals)} transponder(s) saved to {outputs.directory}")
+        write(summary_file(file_path), analysis.summary().with_statement_hash(file_path).to_json())
         
-        # Non-expensable transactions
-        non_expensable = df[
-            df['weekday'].isin([5, 6]) |  # Weekend
-            is_christmas |  # Christmas
-            is_holiday |  # Bank holiday
-            ~df['Time'].between(time(7, 30), time(20, 0))  # Outside work hours
-        ]
+        with _timed(metrics, 'report_rendering') as stage:
+            report = analysis.render_report(report_format or _report_format_for(report_path), summary_only)
+            stage['rows_in'] = len(statement.df)
+            stage['bytes_written'] = write_report(report, report_path)
         
-        # Get month and year from filename
-        month_year = os.path.splitext(os.path.basename(file_path))[0]
-        try:
-            month, year = month_year.split('_')
-            month_name = calendar.month_name[int(month)]
-        except (ValueError, IndexError):
-            # If filename doesn't match expected pattern, use a generic name
-            month_name = "Unknown"
-            year = "Unknown"
+        emit_metrics(metrics.to_dict())
+        return analysis.total
         
-        # Print results
-        print(f"\nToll Expense Report for {month_name} {year}")
-        print("=" * 60)
+    except Exception as e:
+        print(f"Error processing file: {str(e)}")
+        debug("Debug info:")
+        debug(f"File exists: {os.path.exists(file_path)}")
+        return 0
+
+FAST_PATH_MAX_BYTES = 256 * 1024
+
+# Values pandas.read_csv turns into NaN by default; the fast path leaves such rows to pandas
+PANDAS_NA_VALUES = {'', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND',
+                    '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'}
+SEPARATOR_PATTERN = re.compile(r'-+')
+CANONICAL_DATE = re.compile(r'(\d{1,2})-([A-Za-z]{3})-(\d{2}|\d{4})')
+CANONICAL_TIME = re.compile(r'(\d{2}):(\d{2}):(\d{2})')
+CANONICAL_AMOUNT = re.compile(r'-?\d+\.\d{2}')
+
+class _FastRow:
+    """One cleaned vehicle row of the standard-library fast path."""
+    __slots__ = ('position', 'transponder', 'date', 'date_text', 'day', 'weekday', 'seconds', 'posting_date',
+                 'location', 'cents', 'toll_type')
+
+def _parse_canonical_rows(vehicle_lines):
+    """
+    Parse Vehicle Activity lines in the canonical E-Pass format with the csv module, dropping
+    separator rows like _clean_vehicle_df does. Returns None as soon as a line needs the pandas
+    parser's handling (missing values, unusual dates, times or amounts, extra columns).
+    """
+    rows = []
+    reader = csv.reader(vehicle_lines, strict=True)
+    try:
+        for position, fields in enumerate(reader):
+            if reader.line_num != position + 1 or len(fields) != 7:
+                return None  # a quoted field spans lines, or the column count is off
+            if any(field in PANDAS_NA_VALUES for field in fields):
+                return None
+            transponder, date_text, time_text, posting_date, location, amount, toll_type = (
+                field.strip('" ') for field in fields)
+            if any(SEPARATOR_PATTERN.fullmatch(text) for text in (date_text, time_text, amount)):
+                continue
+            date_match = CANONICAL_DATE.fullmatch(date_text)
+            time_match = CANONICAL_TIME.fullmatch(time_text)
+            if (date_match is None or time_match is None or CANONICAL_AMOUNT.fullmatch(amount) is None
+                    or CANONICAL_DATE.fullmatch(posting_date) is None):
+                return None
+            
+            day, month, year = date_match.groups()
+            month = MONTH_NUMBERS.get(month.upper())
+            year = int(year)
+            if year < 100:
+                year += 1900 + 100 * (year < 69)  # same pivot as parse_statement_dates
+            hours, minutes, seconds = (int(part) for part in time_match.groups())
+            if month is None or hours > 23 or minutes > 59 or seconds > 59:
+                return None
+            try:
+                date = datetime(year, month, int(day))
+            except ValueError:
+                return None
+            
+            row = _FastRow()
+            row.position = position
+            row.transponder = transponder
+            row.date = date
+            row.date_text = f"{date:%Y-%m-%d}"
+            row.day = (date - EPOCH).days
+            row.weekday = date.weekday()
+            row.seconds = hours * 3600 + minutes * 60 + seconds
+            row.posting_date = posting_date
+            row.location = location
+            row.cents = round(float(amount) * 100)
+            row.toll_type = toll_type
+            rows.append(row)
+    except csv.Error:
+        return None
+    return rows
+
+def _expensable_records(rows):
+    """Fast-path rows as _expensable_csv_rows records."""
+    return ((row.transponder, row.date_text, row.seconds, row.posting_date, row.location, row.cents, row.toll_type,
+             row.weekday) for row in rows)
+
+def _listing_records(rows):
+    """Fast-path rows as _transaction_lines records."""
+    return ((row.day, row.weekday, row.date_text, row.seconds, row.cents, row.location) for row in rows)
+
+def analyze_small_statement(file_path, metrics=None, report_path=None, report_format=None,
+                            summary_only=False, write=None, keys=None):
+    """
+    Standard-library fast path of analyze_tool_expenses() for small statements: the same
+    totals, output files and report, without importing pandas.
+    Returns None, having written nothing, when the statement has anything the fast path
+    does not handle; the caller then falls back to the pandas path. Errors writing the
+    output files are reported like the pandas path's, returning 0.
+    """
+    if write is None:
+        write = write_text
+    try:
+        with _timed(metrics, 'file_read') as stage:
+            with open(file_path, 'r') as file:
+                lines = file.readlines()
+            stage['bytes_read'] = os.path.getsize(file_path)
+            stage['rows_out'] = len(lines)
+        with _timed(metrics, 'section_location') as stage:
+            account_lines, vehicle_header_lines, vehicle_lines = _locate_sections(lines)
+            stage['rows_in'] = len(lines)
+            stage['rows_out'] = len(vehicle_lines)
+        if account_lines is None:
+            return None
+        with _timed(metrics, 'csv_parse') as stage:
+            rows = _parse_canonical_rows(vehicle_lines)
+            stage['rows_in'] = len(vehicle_lines)
+            stage['rows_out'] = 0 if rows is None else len(rows)
+        if rows is None:
+            return None
         
+        with _timed(metrics, 'classification') as stage:
+            rules = get_expense_rules().compile({row.date.year for row in rows})
+            expensable = [rules.is_expensable(row.transponder, row.day, row.weekday, row.seconds) for row in rows]
+            work_hours = [row for row, is_expensable in zip(rows, expensable) if is_expensable]
+            non_expensable = [row for row, is_expensable in zip(rows, expensable) if not is_expensable]
+            summary = StatementSummary.from_transactions(
+                ((row.weekday, row.date_text, row.location, row.transponder, row.cents, is_expensable)
+                 for row, is_expensable in zip(rows, expensable)), file_path)
+            total_cents = summary.total_cents
+            stage['rows_in'] = len(rows)
+            stage['rows_out'] = len(work_hours)
+    except Exception as e:
+        debug(f"Fast path not used: {str(e)}")
+        return None
+    
+    try:
+        expensable_file_path = f"expensable_{os.path.basename(file_path)}"
+        with _timed(metrics, 'csv_write') as stage:
+            expensable_csv = (EXPENSABLE_CSV_HEADER + _expensable_csv_rows(_expensable_records(work_hours))
+                              + _expensable_total_line(total_cents))
+            write(expensable_file_path, expensable_csv)
+            stage['rows_out'] = len(work_hours) + 1
+            stage['bytes_written'] = len(expensable_csv.encode())
+        print(f"Expensable transactions saved to {expensable_file_path}")
+    
+        print(f"\nFiltering receipt file: {file_path}")
+        receipt_file_path = f"receipt_{os.path.basename(file_path)}"
+        with _timed(metrics, 'receipt_filter') as stage:
+            receipt = (''.join(account_lines) + '\n' + ''.join(vehicle_header_lines)
+                       + ''.join(vehicle_lines[row.position] for row in work_hours) + _receipt_total_line(total_cents))
+            write(receipt_file_path, receipt)
+            stage['rows_in'] = len(rows)
+            stage['rows_out'] = len(work_hours)
+            stage['bytes_written'] = len(receipt.encode())
+        print(f"Filtered receipt saved to: {receipt_file_path}")
+        print(f"Total work-hour vehicle activities amount: ${cents_to_dollars(total_cents):.2f}")
+        print(f"Filtered receipt with Account Activity and expendable vehicle activities saved to {receipt_file_path}")
+    
+        with _timed(metrics, 'transponder_split') as stage:
+            outputs = TransponderOutputs(file_path, account_lines, vehicle_header_lines, write)
+            groups = {}
+            for row in rows:
+                groups.setdefault(row.transponder, [])
+            for row in work_hours:
+                groups[row.transponder].append(row)
+            for transponder in sorted(groups):
+                group = groups[transponder]
+                outputs.add_transponder(transponder, _expensable_csv_rows(_expensable_records(group)),
+                                        ''.join(vehicle_lines[row.position] for row in group),
+                                        sum(row.cents for row in group), len(group))
+            transponder_totals = outputs.close()
+            stage['rows_in'] = len(rows)
+            stage['bytes_written'] = outputs.bytes_written
+        print(f"Per-transponder files for {len(transponder_totals)} transponder(s) saved to {outputs.directory}")
+    
+        write(summary_file(file_path), summary.with_statement_hash(file_path).to_json())
+    
+        with _timed(metrics, 'report_rendering') as stage:
+            month_name, year = get_report_period(file_path)
+            report = render_expense_report(
+                f"Toll Expense Report for {month_name} {year}", summary.daily, len(summary.expensable_dates),
+                *summary.non_expensable, transponder_totals=transponder_totals,
+                fmt=report_format or _report_format_for(report_path),
+                expensable_lines=None if summary_only else _transaction_lines(_listing_records(work_hours)),
+                non_expensable_lines=None if summary_only else _transaction_lines(
+                    _listing_records(non_expensable), rules.holiday_calendar.names), window_label=rules.window_label)
+            stage['rows_in'] = len(rows)
+            stage['bytes_written'] = write_report(report, report_path)
+    
+        if keys is not None:
+            keys.extend(_transaction_key(row.transponder, row.date_text, row.seconds, row.location, row.cents)
+                        for row in work_hours)
+        if metrics is not None:
+            emit_metrics(metrics.to_dict())
+        return cents_to_dollars(total_cents)
+    except Exception as e:
+        print(f"Error processing file: {str(e)}")
+        debug("Debug info:")
+        debug(f"File exists: {os.path.exists(file_path)}")
+        return 0
+
+REPORT_FORMATS = ('text', 'markdown', 'html')
+
+class ReportRenderer:
+    """
+    Builds a report in memory as plain text, Markdown or HTML, so it can be
+    written out with a single buffered write.
+    """
+    def __init__(self, fmt='text'):
+        if fmt not in REPORT_FORMATS:
+            raise ValueError(f"Unknown report format: {fmt}")
+        self.fmt = fmt
+        self.parts = []
+        self._follows_title = False
+    
+    def heading(self, text, level=2, rule='-'):
+        if self.fmt == 'text':
+            # The first section heading sits directly under the title's rule
+            blank = '' if self._follows_title else '\n'
+            self.parts.append(f"{blank}{text}\n{rule * 60}\n")
+            self._follows_title = level == 1
+        elif self.fmt == 'markdown':
+            self.parts.append(f"{'#' * level} {text}\n\n")
+        else:
+            self.parts.append(f"<h{level}>{html.escape(text)}</h{level}>\n")
+    
+    def lines(self, lines):
+        """Add lines of text; `lines` may be a list or a Series of strings."""
+        if len(lines) == 0:
+            return
+        if self.fmt == 'text':
+            self.parts.append('\n'.join(lines) + '\n')
+        elif self.fmt == 'markdown':
+            self.parts.append('- ' + '\n- '.join(lines) + '\n\n')
+        else:
+            items = '</li>\n<li>'.join(html.escape(line) for line in lines)
+            self.parts.append(f"<ul>\n<li>{items}</li>\n</ul>\n")
+    
+    def rule(self, char='='):
+        if self.fmt == 'text':
+            self.parts.append(char * 60 + '\n')
+    
+    def getvalue(self):
+        body = ''.join(self.parts)
+        if self.fmt == 'html':
+            return f"<!DOCTYPE html>\n<html>\n<body>\n{body}</body>\n</html>\n"
+        return body
+
+def _report_format_for(report_path):
+    """Pick the report format from the output file extension."""
+    extension = os.path.splitext(report_path or '')[1].lower()
+    return {'.md': 'markdown', '.markdown': 'markdown', '.html': 'html', '.htm': 'html'}.get(extension, 'text')
+
+def write_report(report, report_path=None):
+    """Write a rendered report to stdout or a file in one write; returns the number of bytes written."""
+    if report_path is None:
+        sys.stdout.write(report)
+    else:
+        with open(report_path, 'w') as file:
+            file.write(report)
+        print(f"Report saved to {report_path}")
+    return len(report.encode())
+
+def _cents_text(cents):
+    """Format integer cents as a dollar string (e.g. 125 -> '1.25')."""
+    return f"{'-' if cents < 0 else ''}{abs(cents) // 100}.{abs(cents) % 100:02d}"
+
+def _transaction_lines(records, holiday_names=None):
+    """
+    'Day, YYYY-MM-DD, HH:MM:SS: $1.25 - Location' report lines, sorted by date and time, for
+    (day number, weekday, 'YYYY-MM-DD', seconds since midnight, cents, location) records.
+    With holiday_names (day number -> name), holiday transactions get a ' [Holiday Name]' marker.
+    """
+    lines = []
+    for day, weekday, date, seconds, cents, location in sorted(records, key=lambda record: (record[0], record[3])):
+        line = f"{DAY_NAMES[weekday]}, {date}, {_time_text(seconds)}: ${_cents_text(cents)} - {location}"
+        if holiday_names is not None:
+            name = holiday_names.get(day)
+            if name is not None:
+                line += f" [{name}]"
+        lines.append(line)
+    return lines
+
+def format_transaction_lines(transactions, holiday_calendar=None):
+    """
+    Format classified vehicle rows as report lines (see _transaction_lines). With a holiday
+    calendar, holiday transactions get a ' [Holiday Name]' marker.
+    """
+    return _transaction_lines(zip(
+        _day_numbers(transactions['Date']).tolist(), transactions['weekday'].tolist(),
+        transactions['Date'].dt.strftime('%Y-%m-%d').tolist(), transactions['Time'].tolist(),
+        transactions['Amount'].tolist(), transactions['Location'].astype(str).tolist()),
+        None if holiday_calendar is None else holiday_calendar.names)
+
+def render_expense_report(title, daily_totals, expensable_days, non_exp_cents, non_exp_count,
+                          expensable=None, non_expensable=None, holiday_calendar=None,
+                          transponder_totals=None, fmt='text', expensable_lines=None, non_expensable_lines=None,
+                          location_totals=None, window_label=None):
+    """
+    Render the toll expense report.
+    daily_totals holds (cents, count) for Monday to Sunday; weekend days are listed only when
+    the expense rules made some of their transactions expensable. The transaction listings are
+    included only when the expensable and non_expensable DataFrames (or their already
+    formatted expensable_lines and non_expensable_lines) are given.
+    transponder_totals holds (transponder, cents, count); fleet accounts with more than one
+    transponder get a per-transponder roll-up. location_totals, (location, cents, count),
+    adds a per-location roll-up. window_label names the expensable hours in the listing
+    heading (by default those of the active rules).
+    """
+    renderer = ReportRenderer(fmt)
+    renderer.heading(title, level=1, rule='=')
+    
+    if expensable is not None:
+        expensable_lines = format_transaction_lines(expensable)
+    if non_expensable is not None:
+        non_expensable_lines = format_transaction_lines(non_expensable, holiday_calendar)
+    
+    if expensable_lines is not None:
         # List all work week transactions
-        print("EXPENSABLE TRANSACTIONS (Workdays 7:30AM-8PM):")
-        print("-" * 60)
-        for _, row in work_hours.sort_values(['Date', 'Time']).iterrows():
-            print(f"{row['day_name']}, {row['Date'].strftime('%Y-%m-%d')}, {row['Time']}: ${row['Amount']:.2f} - {row['Location']}")
-        
-        # Daily Summary for work days
-        print("\nEXPENSABLE DAILY SUMMARY:")
-        print("-" * 60)
-        day_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
-        daily_totals = work_hours.groupby('day_name')['Amount'].agg(['sum', 'count']).reindex(day_order)
-        
-        total_work_amount = 0
-        
-        for day, row in daily_totals.iterrows():
-            if pd.notna(row['sum']):
-                total_work_amount += row['sum']
-                print(f"{day}: ${row['sum']:.2f} ({row['count']} transactions)")
-            else:
-                print(f"{day}: $0.00 (0 transactions)")
-    
-        # Work week summary
-        avg_cost_per_day = total_work_amount / expensable_days if expensable_days > 0 else 0
-        print("\nEXPENSABLE SUMMARY:")
-        print("-" * 60)
-        print(f"Number of days with expensable transactions: {expensable_days}")
-        print(f"Total work week expenses: ${total_work_amount:.2f}")
-        print(f"Average cost per day: ${avg_cost_per_day:.2f}")
-        
-        # Non-expensable transactions summary
-        print("\nNON-EXPENSABLE TRANSACTIONS:")
-        print("=" * 60)
-        print("Transactions outside work hours, weekends, and holidays:")
-        for _, row in non_expensable.sort_values(['Date', 'Time']).iterrows():
+        renderer.heading(f"EXPENSABLE TRANSACTIONS ({window_label or get_expense_rules().window_label()}):")
+        renderer.lines(expensable_lines)
+    
+    renderer.heading("EXPENSABLE DAILY SUMMARY:")
+    renderer.lines([f"{DAY_NAMES[weekday]}: ${cents_to_dollars(cents):.2f} ({int(count)} transactions)"
+                    for weekday, (cents, count) in enumerate(daily_totals) if weekday < 5 or count])
+    
+    # Work week summary
+    total_work_amount = cents_to_dollars(sum(cents for cents, _ in daily_totals))
+    avg_cost_per_day = total_work_amount / expensable_days if expensable_days > 0 else 0
+    renderer.heading("EXPENSABLE SUMMARY:")
+    renderer.lines([
+        f"Number of days with expensable transactions: {expensable_days}",
+        f"Total work week expenses: ${total_work_amount:.2f}",
+        f"Average cost per day: ${avg_cost_per_day:.2f}",
+    ])
+    
+    if transponder_totals is not None and len(transponder_totals) > 1:
+        renderer.heading("EXPENSABLE BY TRANSPONDER:")
+        renderer.lines([f"{transponder}: ${cents_to_dollars(cents):.2f} ({int(count)} transactions)"
+                        for transponder, cents, count in transponder_totals])
+    
+    if location_totals:
+        renderer.heading("EXPENSABLE BY LOCATION:")
+        renderer.lines([f"{location}: ${cents_to_dollars(cents):.2f} ({int(count)} transactions)"
+                        for location, cents, count in location_totals])
+    
+    if non_expensable_lines is not None:
+        renderer.heading("NON-EXPENSABLE TRANSACTIONS:", rule='=')
+        renderer.lines(["Transactions outside work hours, weekends, and holidays:"] + non_expensable_lines)
+    
+    renderer.heading("NON-EXPENSABLE SUMMARY:")
+    renderer.lines([
+        f"Total non-expensable transactions: {non_exp_count}",
+        f"Total non-expensable amount: ${cents_to_dollars(non_exp_cents):.2f}",
+    ])
+    renderer.rule('=')
+    return renderer.getvalue()
+
+STREAMING_THRESHOLD_BYTES = 50 * 1024 * 1024
+STREAM_CHUNK_ROWS = 100_000
+
+def _line_chunks(file, chunksize):
+    """Yield lists of up to chunksize non-empty lines of a file, dropping blank lines like _locate_sections."""
+    chunk = []
+    for line in file:
+        if line.strip():
+            chunk.append(line)
+            if len(chunk) == chunksize:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+def analyze_tool_expenses_streaming(file_path, chunksize=STREAM_CHUNK_ROWS, metrics=None, report_path=None,
+                                    report_format=None, keys=None):
+    """
+    Analyze a statement in bounded memory.
+    The Vehicle Activity section is read in chunks of `chunksize` rows; each chunk is classified
+    and its expensable rows are appended to the expensable_ CSV and receipt_ files straight away.
+    Only running aggregates are kept, so the report is summary-only (no per-transaction listings).
+    Returns the total expensable amount.
+    """
+    if metrics is None:
+        metrics = StatementMetrics(file_path)
+    try:
+        print(f"\nStreaming analysis of: {file_path}")
+        expensable_file_path = f"expensable_{os.path.basename(file_path)}"
+        receipt_file_path = f"receipt_{os.path.basename(file_path)}"
+        
+        metrics.record('file_read', 0.0, bytes_read=os.path.getsize(file_path))
+        with open(file_path, 'r') as file:
+            with _timed(metrics, 'section_location'):
+                # Collect the (small) Account Activity section and stop at the Vehicle Activity header,
+                # leaving the file positioned at the first data row
+                account_lines = None
+                vehicle_header_lines = []
+                while True:
+                    line = file.readline()
+                    if not line:
+                        raise ValueError("Could not find the Vehicle Activity header")
+                    stripped = line.strip()
+                    if stripped == ACCOUNT_SECTION and not vehicle_header_lines:
+                        account_lines = [line]
+                    elif stripped == VEHICLE_SECTION and not vehicle_header_lines:
+                        vehicle_header_lines.append(line)
+                    elif VEHICLE_HEADER in line:
+                        vehicle_header_lines.append(line)
+                        break
+                    elif account_lines is not None and not vehicle_header_lines:
+                        account_lines.append(line)
+            
+            write_receipt = account_lines is not None and len(vehicle_header_lines) == 2
+            receipt_file = None
+            if write_receipt:
+                receipt_file = open(receipt_file_path, 'w')
+                receipt_file.write(''.join(account_lines) + '\n' + ''.join(vehicle_header_lines))
+            outputs = TransponderOutputs(file_path, account_lines if write_receipt else None,
+                                         vehicle_header_lines if write_receipt else None)
+            
+            total_cents = 0
+            receipt_cents = 0
+            weekday_sums = [0] * 7
+            weekday_counts = [0] * 7
+            expensable_day_numbers = set()
+            summary = StatementSummary(file_path)
+            non_exp_cents = 0
+            non_exp_count = 0
+            rows_read = 0
+            header_written = False
+            
+            columns = VEHICLE_HEADER.split(',')
+            chunks = _line_chunks(file, chunksize)
             try:
-                holiday_marker = ""
-                # Convert the datetime to string in the correct format
-                date_str = row['Date'].strftime('%Y-%m-%d')
-                
-                # Check if this exact date matches any holiday
-                if date_str in holiday_names.index:
-                    holiday_marker = f" [{holiday_names[date_str]}]"
-                elif row['Date'].month == 12 and row['Date'].day == 25:
-                    holiday_marker = " [Christmas Day]"
+                while True:
+                    with _timed(metrics, 'csv_parse') as stage:
+                        # The chunk's raw lines are kept to copy its receipt rows as they are
+                        lines = next(chunks, None)
+                        raw_chunk = None if lines is None else pd.read_csv(
+                            StringIO(''.join(lines)), names=columns, header=None, dtype=str, index_col=False)
+                        stage['rows_out'] = 0 if raw_chunk is None else len(raw_chunk)
+                    if raw_chunk is None:
+                        break
+                    rows_read += len(raw_chunk)
+                    df = _clean_vehicle_df(raw_chunk.copy(), metrics)
+                    if df.empty:
+                        continue
+                    with _timed(metrics, 'classification') as stage:
+                        df['weekday'] = df['Date'].dt.dayofweek.astype('int8')
+                        expensable = get_expensable_mask(df)
+                        work_hours = df[expensable]
+                        
+                        # Running aggregates
+                        total_cents += int(work_hours['Amount'].sum())
+                        daily = work_hours.groupby('weekday')['Amount'].agg(['sum', 'count'])
+                        for weekday, row in daily.iterrows():
+                            weekday_sums[weekday] += int(row['sum'])
+                            weekday_counts[weekday] += int(row['count'])
+                        expensable_day_numbers.update(np.unique(_day_numbers(work_hours['Date'])).tolist())
+                        non_exp_cents += int(df.loc[~expensable, 'Amount'].sum())
+                        non_exp_count += int((~expensable).sum())
+                        summary.merge(StatementSummary.from_frame(df, expensable))
+                        if keys is not None:
+                            keys.extend(transaction_keys(work_hours))
+                        stage['rows_in'] = len(df)
+                        stage['rows_out'] = len(work_hours)
                     
-                print(f"{row['day_name']}, {date_str}, {row['Time']}: ${row['Amount']:.2f} - {row['Location']}{holiday_marker}")
-            except Exception as e:
-                print(f"Error processing row: {e}")
-                continue
-        
-        # Non-expensable summary
-        non_exp_total = non_expensable['Amount'].sum()
-        print("\nNON-EXPENSABLE SUMMARY:")
-        print("-" * 60)
-        print(f"Total non-expensable transactions: {len(non_expensable)}")
-        print(f"Total non-expensable amount: ${non_exp_total:.2f}")
-        print("=" * 60)
-        
-        return total_work_amount
+                    with _timed(metrics, 'csv_write') as stage:
+                        # Append this chunk's expensable rows (Date written as in the in-memory path)
+                        write_text(expensable_file_path, ('' if header_written else EXPENSABLE_CSV_HEADER)
+                                   + _expensable_frame_csv(work_hours), 'a' if header_written else 'w')
+                        header_written = True
+                        stage['rows_out'] = len(work_hours)
+                    
+                    if receipt_file is not None:
+                        with _timed(metrics, 'receipt_filter') as stage:
+                            receipt_file.write(''.join(lines[i] for i in df.index[expensable]))
+                            receipt_cents += int(df.loc[expensable, 'Amount'].sum())
+                            stage['rows_in'] = len(df)
+                            stage['rows_out'] = int(expensable.sum())
+                    
+                    with _timed(metrics, 'transponder_split') as stage:
+                        outputs.add(df, expensable, lambda index: ''.join(lines[i] for i in index))
+                        stage['rows_in'] = len(df)
+                # Only a receipt whose rows were all written gets a total
+                if receipt_file is not None:
+                    receipt_file.write(_receipt_total_line(receipt_cents))
+            finally:
+                if receipt_file is not None:
+                    receipt_file.close()
+        
+        # Close the expensable file with the total row
+        write_text(expensable_file_path, ('' if header_written else EXPENSABLE_CSV_HEADER)
+                   + _expensable_total_line(total_cents), 'a' if header_written else 'w')
+        with _timed(metrics, 'transponder_split') as stage:
+            transponder_totals = outputs.close()
+            stage['bytes_written'] = outputs.bytes_written
+        write_text(summary_file(file_path), summary.with_statement_hash(file_path).to_json())
+        metrics.record('csv_write', 0.0, bytes_written=os.path.getsize(expensable_file_path))
+        if receipt_file is not None:
+            metrics.record('receipt_filter', 0.0, bytes_written=os.path.getsize(receipt_file_path))
+        print(f"Read {rows_read} vehicle rows in chunks of {chunksize}")
+        print(f"Expensable transactions saved to {expensable_file_path}")
+        if receipt_file is not None:
+            print(f"Filtered receipt saved to: {receipt_file_path}")
+            print(f"Total work-hour vehicle activities amount: ${cents_to_dollars(receipt_cents):.2f}")
+        print(f"Per-transponder files for {len(transponder_totals)} transponder(s) saved to {outputs.directory}")
+        
+        with _timed(metrics, 'report_rendering') as stage:
+            month_name, year = get_report_period(file_path)
+            report = render_expense_report(
+                f"Toll Expense Report for {month_name} {year} (summary only)",
+                list(zip(weekday_sums, weekday_counts)), len(expensable_day_numbers),
+                non_exp_cents, non_exp_count, transponder_totals=transponder_totals,
+                fmt=report_format or _report_format_for(report_path))
+            stage['bytes_written'] = write_report(report, report_path)
+        total_amount = cents_to_dollars(total_cents)
+        
+        emit_metrics(metrics.to_dict())
+        return total_amount
         
     except Exception as e:
         print(f"Error processing file: {str(e)}")
-        print("Debug info:")
-        print(f"File exists: {os.path.exists(file_path)}")
+        debug("Debug info:")
+        debug(f"File exists: {os.path.exists(file_path)}")
         return 0
 
 def clean_date(date_str):
@@ -373,91 +1720,494 @@ def clean_date(date_str):
         return None
     return date_str.strip('" ')  # Remove quotes and spaces
 
-def read_csv(file_path):
-    try:
-        print("\nDebug: Starting file read")
-        # Read the entire file as text first
-        with open(file_path, 'r') as file:
+
+class ParsedStatement:
+    """
+    A statement parsed in a single pass over the file.
+    Holds the raw Account Activity lines and Vehicle Activity lines used for receipts,
+    and the cleaned vehicle DataFrame used for the expense analysis.
+    The DataFrame index is the position of each row in vehicle_lines (a list, or the
+    SectionLines of a memory-mapped statement).
+    file_path is None for a statement read from bytes or a file-like object without a name.
+    """
+    def __init__(self, file_path, account_lines, vehicle_header_lines, vehicle_lines, df):
+        self.file_path = file_path
+        self.account_lines = account_lines
+        self.vehicle_header_lines = vehicle_header_lines
+        self.vehicle_lines = vehicle_lines
+        self.df = df
+
+def _locate_sections(lines):
+    """
+    Find the Account Activity and Vehicle Activity sections and the exact header line in one scan.
+    Returns (account_lines, vehicle_header_lines, vehicle_lines); the first two are None when
+    the section titles are missing. Raises ValueError without a Vehicle Activity header.
+    """
+    account_start = None
+    vehicle_start = None
+    header_index = None
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        if stripped == ACCOUNT_SECTION and vehicle_start is None:
+            account_start = i
+        elif stripped == VEHICLE_SECTION and vehicle_start is None:
+            vehicle_start = i
+        elif VEHICLE_HEADER in line:
+            header_index = i
+            break
+    if header_index is None:
+        raise ValueError("Could not find the Vehicle Activity header")
+    debug(f"Debug: Found header at line {header_index}")
+    
+    account_lines = None
+    vehicle_header_lines = None
+    if account_start is not None and vehicle_start is not None:
+        account_lines = lines[account_start:vehicle_start]
+        vehicle_header_lines = lines[vehicle_start:vehicle_start + 2]
+    
+    # Keep only non-empty data lines so DataFrame rows line up with the raw lines
+    vehicle_lines = [line for line in lines[header_index + 1:] if line.strip()]
+    return account_lines, vehicle_header_lines, vehicle_lines
+
+def _section_line_pattern(title):
+    """Regex matching a line that holds only the section title, as _locate_sections compares stripped lines."""
+    return re.compile(rb'^[ \t\f\v]*' + re.escape(title.encode()) + rb'[ \t\f\v]*$', re.MULTILINE)
+
+ACCOUNT_SECTION_LINE = _section_line_pattern(ACCOUNT_SECTION)
+VEHICLE_SECTION_LINE = _section_line_pattern(VEHICLE_SECTION)
+WHITESPACE_BYTES = b' \t\f\v'
+LINE_ENDING_PROBE_BYTES = 4096
+NEWLINE_SCAN_BYTES = 1024 * 1024
+
+def _line_end(buffer, position):
+    """Offset just past the end of the line holding `position`."""
+    newline = buffer.find(b'\n', position)
+    return len(buffer) if newline < 0 else newline + 1
+
+def _split_lines(data):
+    """Decode bytes into lines split on '\\n' only, like readlines() on a text file."""
+    return StringIO(data.decode(), newline='\n').readlines()
+
+class SectionLines:
+    """
+    The non-empty Vehicle Activity data lines of a memory-mapped statement, kept as byte offsets
+    into the section's bytes (copied out of the map, which is closed after parsing). A line is
+    sliced out and decoded only when indexed (for the receipt rows), so it stands in for the
+    list of lines the line-based parser keeps without splitting or decoding the section.
+    """
+    def __init__(self, buffer, starts, ends):
+        self.buffer = buffer
+        self.starts = starts
+        self.ends = ends
+    
+    def __len__(self):
+        return len(self.starts)
+    
+    def __getitem__(self, position):
+        return self.buffer[int(self.starts[position]):int(self.ends[position])].decode()
+
+def _locate_sections_mapped(buffer):
+    """
+    Byte-search version of _locate_sections over a mapped statement.
+    Returns (account_lines, vehicle_header_lines, data_start), data_start being the offset of the
+    first line after the Vehicle Activity header. Raises ValueError without the header.
+    """
+    header = buffer.find(VEHICLE_HEADER.encode())
+    if header < 0:
+        raise ValueError("Could not find the Vehicle Activity header")
+    header_start = buffer.rfind(b'\n', 0, header) + 1
+    data_start = _line_end(buffer, header)
+    debug(f"Debug: Found header at byte {header_start}")
+    
+    account_lines = None
+    vehicle_header_lines = None
+    vehicle = VEHICLE_SECTION_LINE.search(buffer, 0, header_start)
+    if vehicle is not None:
+        # The last Account Activity title before the Vehicle Activity one starts the section
+        account = None
+        for account in ACCOUNT_SECTION_LINE.finditer(buffer, 0, vehicle.start()):
+            pass
+        if account is not None:
+            account_lines = _split_lines(buffer[account.start():vehicle.start()])
+            vehicle_header_lines = _split_lines(buffer[vehicle.start():_line_end(buffer, _line_end(buffer, vehicle.start()))])
+    return account_lines, vehicle_header_lines, data_start
+
+def _section_data_lines(section):
+    """
+    Offsets of the non-empty data lines of the Vehicle Activity section's bytes, found with a
+    vectorized newline search over NEWLINE_SCAN_BYTES blocks, so the search needs no more than
+    a block of scratch memory. Returns None when a line holds only whitespace, which the
+    line-based path drops but the CSV parser would not.
+    """
+    data = np.frombuffer(section, dtype=np.uint8)
+    newlines = [np.zeros(0, dtype=np.intp)]
+    for offset in range(0, len(data), NEWLINE_SCAN_BYTES):
+        newlines.append(np.flatnonzero(data[offset:offset + NEWLINE_SCAN_BYTES] == ord('\n')) + offset)
+    newlines = np.concatenate(newlines)
+    starts = np.concatenate(([0], newlines + 1))
+    ends = np.append(newlines + 1, len(section))
+    lengths = ends - starts
+    lengths[:len(newlines)] -= 1  # every line but the last ends in a newline
+    keep = lengths > 0
+    starts, ends = starts[keep], ends[keep]
+    # Data rows start with a quote or a digit; only lines starting with whitespace need a closer look
+    first_bytes = data[starts] if len(starts) else np.zeros(0, np.uint8)
+    for position in np.flatnonzero(np.isin(first_bytes, list(WHITESPACE_BYTES))):
+        if not section[int(starts[position]):int(ends[position])].strip():
+            return None
+    return SectionLines(section, starts, ends)
+
+def _parse_mapped_statement(source, metrics=None, name=None):
+    """
+    Parse a statement from a file path, memory-mapped rather than read, or from bytes.
+    The sections are located by byte search, and the Vehicle Activity range is copied out of the
+    map once and handed to the CSV parser, without building line lists or joined strings; the
+    raw receipt lines are sliced from that copy. The map is closed before parsing, so the
+    statement file is not held open.
+    Returns None when the statement needs the line-based path instead (carriage-return
+    line endings, whitespace-only lines, or an empty file).
+    """
+    with _timed(metrics, 'file_read') as stage:
+        if isinstance(source, (bytes, bytearray)):
+            buffer = bytes(source)
+        else:
+            with open(source, 'rb') as file:
+                # Statements use one line ending throughout, so a Windows file shows in its head
+                if os.fstat(file.fileno()).st_size == 0 or b'\r' in file.read(LINE_ENDING_PROBE_BYTES):
+                    return None
+                buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        stage['bytes_read'] = len(buffer)
+    
+    with _timed(metrics, 'section_location') as stage:
+        try:
+            if buffer.find(b'\r') >= 0:
+                return None  # the line-based path normalizes line endings
+            account_lines, vehicle_header_lines, data_start = _locate_sections_mapped(buffer)
+            section = buffer[data_start:]
+        finally:
+            if isinstance(buffer, mmap.mmap):
+                buffer.close()
+        vehicle_lines = _section_data_lines(section)
+        if vehicle_lines is None:
+            return None
+        stage['rows_out'] = len(vehicle_lines)
+    
+    with _timed(metrics, 'csv_parse') as stage:
+        df = pd.read_csv(BytesIO(section), names=VEHICLE_HEADER.split(','), header=None, index_col=False,
+                         dtype={column: str for column in CATEGORY_COLUMNS})
+        stage['rows_in'] = len(vehicle_lines)
+        stage['rows_out'] = len(df)
+    if len(df) != len(vehicle_lines):
+        return None  # e.g. a quoted field spanning lines; rows would not line up with the raw lines
+    debug(f"Debug: Initial DataFrame size: {len(df)}")
+    df = _clean_vehicle_df(df, metrics)
+    return ParsedStatement(name, account_lines, vehicle_header_lines, vehicle_lines, df)
+
+def _read_statement_lines(source):
+    """
+    Read the lines of a statement given as a path, bytes or a text or binary file-like object.
+    Line endings are normalized as when the file is opened in text mode.
+    Returns (lines, bytes read).
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'r') as file:
             lines = file.readlines()
-        print(f"Debug: Read {len(lines)} lines from file")
-        
-        # Find the exact header line
-        header_line = "Transponder Number,Date,Time,Posting Date,Location,Amount,Toll Type"
-        header_index = next(i for i, line in enumerate(lines) if header_line in line)
-        print(f"Debug: Found header at line {header_index}")
-        
+        return lines, os.path.getsize(source)
+    data = source if isinstance(source, (bytes, bytearray)) else source.read()
+    size = len(data)
+    if isinstance(data, (bytes, bytearray)):
+        data = bytes(data).decode()
+    else:
+        size = len(data.encode())
+    return StringIO(data, newline=None).readlines(), size
+
+def _statement_name(source, name=None):
+    """The file name a statement's outputs and report period are derived from, if it has one."""
+    if name is not None:
+        return name
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source)
+    name = getattr(source, 'name', None)
+    return name if isinstance(name, str) else None
+
+def _parse_statement(source, metrics=None, name=None):
+    """
+    Parse a statement from a path, bytes or file-like object; raises on unreadable statements.
+    Paths and bytes go through the memory-mapped parser (_parse_mapped_statement), falling
+    back to reading lines when it cannot handle the statement.
+    """
+    name = _statement_name(source, name)
+    if not isinstance(source, (str, os.PathLike, bytes, bytearray)):
+        data = source.read()  # a file-like object can only be read once
+        source = data if isinstance(data, (bytes, bytearray)) else StringIO(data)
+    if not isinstance(source, StringIO):
+        statement = _parse_mapped_statement(source, metrics, name)
+        if statement is not None:
+            return statement
+    
+    debug("\nDebug: Starting file read")
+    # Read the entire file as text first
+    with _timed(metrics, 'file_read') as stage:
+        lines, stage['bytes_read'] = _read_statement_lines(source)
+        stage['rows_out'] = len(lines)
+    debug(f"Debug: Read {len(lines)} lines from file")
+    
+    with _timed(metrics, 'section_location') as stage:
+        account_lines, vehicle_header_lines, vehicle_lines = _locate_sections(lines)
+        stage['rows_in'] = len(lines)
+        stage['rows_out'] = len(vehicle_lines)
+    
+    df = _parse_vehicle_lines(vehicle_lines, metrics)
+    return ParsedStatement(name, account_lines, vehicle_header_lines, vehicle_lines, df)
+
+def parse_statement(file_path, metrics=None):
+    """
+    Read a statement once, locate the Account Activity and Vehicle Activity sections
+    and parse the vehicle rows into a cleaned DataFrame.
+    file_path may also be the statement's bytes or a file-like object.
+    Returns a ParsedStatement, or None if the file could not be parsed.
+    """
+    try:
+        return _parse_statement(file_path, metrics)
+    except Exception as e:
+        print(f"Error processing file: {str(e)}")
+        debug("Debug info:")
+        if isinstance(file_path, (str, os.PathLike)):
+            debug(f"File exists: {os.path.exists(file_path)}")
+        return None
+
+def _parse_vehicle_lines(vehicle_lines, metrics=None):
+    """Parse and clean the raw Vehicle Activity data lines into a DataFrame."""
+    with _timed(metrics, 'csv_parse') as stage:
         # Create a new StringIO with just the header and data
-        data_section = StringIO(header_line + '\n' + ''.join(lines[header_index + 1:]))
+        data_section = StringIO(VEHICLE_HEADER + '\n' + ''.join(vehicle_lines))
         
         # Read the CSV file, explicitly telling pandas not to use the first column as index
-        df = pd.read_csv(data_section, index_col=False)
-        print(f"Debug: Initial DataFrame size: {len(df)}")
-        
-        print("\nDebug: Raw columns:")
-        print(df.columns.tolist())
-        print("\nDebug: Raw data sample:")
-        print(df.head())
-        
+        df = pd.read_csv(data_section, index_col=False, dtype={column: str for column in CATEGORY_COLUMNS})
+        stage['rows_in'] = len(vehicle_lines)
+        stage['rows_out'] = len(df)
+    debug(f"Debug: Initial DataFrame size: {len(df)}")
+    
+    debug("\nDebug: Raw columns:", level=2)
+    debug(df.columns.tolist(), level=2)
+    debug("\nDebug: Raw data sample:", level=2)
+    debug(df.head(), level=2)
+    
+    return _clean_vehicle_df(df, metrics)
+
+MONTH_NUMBERS = {name.upper(): number for number, name in enumerate(calendar.month_abbr) if name}
+
+def parse_statement_dates(dates):
+    """
+    Parse statement dates such as 05-Jan-25 (%d-%b-%y, 4-digit years also accepted) to datetime64.
+    Each distinct date string is parsed once through the month-abbreviation table and
+    mapped back to the rows; unparseable dates become NaT.
+    """
+    codes, uniques = pd.factorize(dates.astype(str).str.strip())
+    if len(uniques) == 0:
+        return pd.Series(pd.NaT, index=dates.index, dtype='datetime64[ns]')
+    parts = pd.Series(uniques).str.split('-', n=2, expand=True)
+    if parts.shape[1] < 3:
+        return pd.Series(pd.NaT, index=dates.index, dtype='datetime64[ns]')
+    day = pd.to_numeric(parts[0], errors='coerce')
+    month = parts[1].str.upper().map(MONTH_NUMBERS)
+    year = pd.to_numeric(parts[2], errors='coerce')
+    # Same pivot as strptime's %y: 69-99 are 1900s, 00-68 are 2000s
+    year = year.where(year >= 100, year + 1900 + 100 * (year < 69))
+    parsed = pd.to_datetime(pd.DataFrame({'year': year, 'month': month, 'day': day}), errors='coerce')
+    # Append NaT so rows with a missing value (code -1) map to it
+    values = np.append(parsed.to_numpy(dtype='datetime64[ns]'), np.datetime64('NaT', 'ns'))
+    return pd.Series(values[codes], index=dates.index)
+
+def parse_time_of_day(times):
+    """Parse HH:MM:SS strings to seconds since midnight; invalid times become NaN."""
+    parts = times.astype(str).str.strip().str.split(':', n=2, expand=True)
+    if parts.shape[1] < 3:
+        return pd.Series(np.nan, index=times.index)
+    hours, minutes, seconds = (pd.to_numeric(parts[i], errors='coerce') for i in range(3))
+    valid = hours.between(0, 23) & minutes.between(0, 59) & seconds.between(0, 59)
+    return (hours * 3600 + minutes * 60 + seconds).where(valid)
+
+def _time_text(seconds):
+    """Format integer seconds since midnight as HH:MM:SS."""
+    return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+def format_time_of_day(seconds):
+    """Format a Series of integer seconds since midnight as HH:MM:SS strings."""
+    return pd.Series([_time_text(value) for value in seconds.astype('int64').tolist()], index=seconds.index,
+                     dtype=object)
+
+def _transaction_key(transponder, date, seconds, location, cents):
+    """
+    Dedup key of one transaction, 'transponder,YYYY-MM-DD,HH:MM:SS,location,cents'.
+    The same toll listed in two overlapping statements gets the same key.
+    """
+    return f"{transponder},{date},{_time_text(seconds)},{location},{cents}"
+
+def transaction_keys(df):
+    """Dedup keys (see _transaction_key) of cleaned vehicle rows."""
+    if df.empty:
+        return []
+    return [_transaction_key(*fields) for fields in zip(
+        df['Transponder Number'].astype(str).tolist(), df['Date'].dt.strftime('%Y-%m-%d').tolist(),
+        df['Time'].tolist(), df['Location'].astype(str).tolist(), df['Amount'].tolist())]
+
+CATEGORY_COLUMNS = ['Transponder Number', 'Location', 'Toll Type']
+
+def _clean_vehicle_df(df, metrics=None):
+    """
+    Strip quoting, drop separator rows and convert to a compact typed representation:
+    Amount as int32 cents, Date as datetime64, Time as int32 seconds since midnight,
+    and Transponder Number, Location and Toll Type as categoricals.
+    """
+    with _timed(metrics, 'cleaning') as stage:
+        stage['rows_in'] = len(df)
         # Clean up the data first - before any filtering
+        # (text columns are object dtype on pandas 2 and the str dtype on pandas 3)
         for col in df.columns:
-            if df[col].dtype == 'object':
+            if pd.api.types.is_string_dtype(df[col].dtype):
                 df[col] = df[col].str.strip('" ')
         
         # Filter out rows that only contain dashes (only check object columns)
         valid_rows = pd.Series([True] * len(df), index=df.index)
         
-        # Check Date column for dashes only if it's still object type
-        if df['Date'].dtype == 'object':
+        # Check Date column for dashes only if it's still text
+        if pd.api.types.is_string_dtype(df['Date'].dtype):
             valid_rows &= ~df['Date'].str.contains('^-+$', regex=True, na=False)
         
-        # Check Time column for dashes only if it's still object type  
-        if df['Time'].dtype == 'object':
+        # Check Time column for dashes only if it's still text
+        if pd.api.types.is_string_dtype(df['Time'].dtype):
             valid_rows &= ~df['Time'].str.contains('^-+$', regex=True, na=False)
         
-        # Check Amount column for dashes only if it's still object type
-        if df['Amount'].dtype == 'object':
+        # Check Amount column for dashes only if it's still text
+        if pd.api.types.is_string_dtype(df['Amount'].dtype):
             valid_rows &= ~df['Amount'].str.contains('^-+$', regex=True, na=False)
         
         df = df[valid_rows]
-        print(f"Debug: After filtering dashes: {len(df)}")
+        debug(f"Debug: After filtering dashes: {len(df)}")
         
-        # Convert Amount to numeric
-        df['Amount'] = pd.to_numeric(df['Amount'], errors='coerce')
+        # Convert Amount to exact integer cents
+        df['Amount'] = (pd.to_numeric(df['Amount'], errors='coerce') * 100).round()
         # Remove rows where Amount conversion failed
         df = df.dropna(subset=['Amount'])
-        print(f"Debug: After amount conversion: {len(df)}")
+        df['Amount'] = df['Amount'].astype('int32')
+        debug(f"Debug: After amount conversion: {len(df)}")
         
-        # Convert Date to datetime - handle both 2-digit and 4-digit years
-        df['Date'] = pd.to_datetime(df['Date'], format='%d-%b-%y', errors='coerce')
+        # Repeated strings are stored once per distinct value
+        for col in CATEGORY_COLUMNS:
+            df[col] = df[col].astype('category')
+        stage['rows_out'] = len(df)
+    
+    with _timed(metrics, 'datetime_conversion') as stage:
+        stage['rows_in'] = len(df)
+        # Convert Date to datetime64 - handle both 2-digit and 4-digit years
+        df['Date'] = parse_statement_dates(df['Date'])
         # Remove rows where Date conversion failed
         df = df.dropna(subset=['Date'])
         
-        # Time is already in HH:MM:SS format - only strip if it's still object type
-        if df['Time'].dtype == 'object':
-            df['Time'] = df['Time'].str.strip()
-        
-        # Convert Time to datetime.time for proper comparison
-        df['Time'] = pd.to_datetime(df['Time'], format='%H:%M:%S').dt.time
-        
-        print(f"Debug: Final DataFrame size: {len(df)}")
-        print("\nDebug: Sample of processed data:")
-        print(df[['Date', 'Time', 'Amount']].head())
-        
-        return df
-        
-    except Exception as e:
-        print(f"Error processing file: {str(e)}")
-        print("Debug info:")
-        print(f"File exists: {os.path.exists(file_path)}")
-        try:
-            print("\nDebug: Raw data sample at error:")
-            print(df.head())
-        except:
-            pass
+        # Convert Time to integer seconds since midnight so comparisons stay vectorized
+        df['Time'] = parse_time_of_day(df['Time'])
+        # Remove rows where Time conversion failed
+        df = df.dropna(subset=['Time'])
+        df['Time'] = df['Time'].astype('int32')
+        stage['rows_out'] = len(df)
+    
+    debug(f"Debug: Final DataFrame size: {len(df)}")
+    debug("\nDebug: Sample of processed data:", level=2)
+    debug(df[['Date', 'Time', 'Amount']].head(), level=2)
+    
+    return df
+
+def read_csv(file_path):
+    """Read a statement and return the cleaned Vehicle Activity DataFrame."""
+    statement = parse_statement(file_path)
+    if statement is None:
+        return None
+    return statement.df
+
+CACHE_MANIFEST = '.epass_cache.json'
+RULES_VERSION = '6'  # Bump whenever the expensability rules or output formats change
+
+def _file_hash(path):
+    """SHA-256 of a file's contents, read in 1 MB blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _rules_fingerprint():
+    """Fingerprint of everything besides the input that affects computed totals: code version and rule configuration."""
+    return hashlib.sha256(f"{RULES_VERSION}:{get_expense_rules().fingerprint()}".encode()).hexdigest()[:16]
+
+def load_cache_manifest(manifest_path=CACHE_MANIFEST):
+    """Load the incremental processing manifest, or an empty one if missing or unreadable."""
+    try:
+        with open(manifest_path, 'r') as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        manifest = {}
+    manifest.setdefault('statements', {})
+    manifest.setdefault('receipts', {})
+    return manifest
+
+def save_cache_manifest(manifest, manifest_path=CACHE_MANIFEST):
+    """Write the manifest atomically so an interrupted run never leaves it half written."""
+    temp_path = manifest_path + '.tmp'
+    with open(temp_path, 'w') as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+    os.replace(temp_path, manifest_path)
+
+def _statement_outputs(file_path):
+    """Output files generated for a statement, including the per-transponder files."""
+    base_name = os.path.basename(file_path)
+    per_transponder = sorted(glob.glob(os.path.join(transponder_directory(file_path), '*.csv')))
+    return [f"expensable_{base_name}", f"receipt_{base_name}", summary_file(file_path)] + per_transponder
+
+def _cached_statement_total(manifest, file_path):
+    """Return the cached total for an unchanged statement whose outputs are unchanged, else None."""
+    entry = manifest['statements'].get(file_path)
+    if not entry or entry.get('rules') != _rules_fingerprint():
+        return None
+    try:
+        if entry.get('hash') != _file_hash(file_path):
+            return None
+        for output, output_hash in entry.get('outputs', {}).items():
+            if _file_hash(output) != output_hash:
+                return None
+    except OSError:
         return None
+    return entry['total']
+
+def _record_statement(manifest, file_path, total):
+    """Remember a processed statement, its outputs and its total in the manifest."""
+    outputs = {}
+    for output in _statement_outputs(file_path):
+        if os.path.exists(output):
+            outputs[output] = _file_hash(output)
+    # An analysis that failed before writing anything is not worth caching
+    if not outputs:
+        return
+    manifest['statements'][file_path] = {
+        'hash': _file_hash(file_path),
+        'rules': _rules_fingerprint(),
+        'total': float(total),
+        'outputs': outputs,
+    }
 
-def add_totals_to_all_receipts():
-    """Add totals to all existing receipt files."""
+def _record_receipt(manifest, receipt_file, total):
+    """Remember a receipt's total; the statement that generated it keeps treating it as unchanged."""
+    receipt_hash = _file_hash(receipt_file)
+    manifest['receipts'][receipt_file] = {'hash': receipt_hash, 'total': float(total)}
+    for entry in manifest['statements'].values():
+        if receipt_file in entry.get('outputs', {}):
+            entry['outputs'][receipt_file] = receipt_hash
+
+def add_totals_to_all_receipts(use_cache=True):
+    """
+    Add totals to all existing receipt files.
+    Receipts unchanged since the last run (per the cache manifest) are skipped and their cached totals reused.
+    """
     # Find all receipt files
     receipt_files = glob.glob('receipt_*.csv')
     
@@ -469,38 +2219,165 @@ def add_totals_to_all_receipts():
     for file in receipt_files:
         print(f"  - {file}")
     
+    manifest = load_cache_manifest() if use_cache else None
     total_all_amount = 0.0
     for receipt_file in sorted(receipt_files):
         print(f"\n{'='*60}")
         print(f"Updating: {receipt_file}")
         print('='*60)
         
-        # Add total to the receipt file
-        result = add_total_to_receipt_file(receipt_file)
-        if result:
-            # Extract the total amount from the file for summary
-            try:
-                with open(receipt_file, 'r') as file:
-                    lines = file.readlines()
-                for line in lines:
-                    if 'TOTAL VEHICLE ACTIVITIES' in line:
-                        parts = line.split(',')
-                        if len(parts) >= 6:
-                            amount_str = parts[5].strip('"')
-                            amount = float(amount_str)
-                            total_all_amount += amount
-                            break
-            except:
-                pass
+        if manifest is not None:
+            entry = manifest['receipts'].get(receipt_file)
+            if entry and entry.get('hash') == _file_hash(receipt_file):
+                print(f"Unchanged since last run, using cached total: ${entry['total']:.2f}")
+                total_all_amount += entry['total']
+                continue
+        
+        # Add total to the receipt file; batch mode returns the total from the same scan
+        amount = add_total_to_receipt_file(receipt_file, return_total=True)
+        if amount is not None:
+            total_all_amount += amount
+            if manifest is not None:
+                _record_receipt(manifest, receipt_file, amount)
+    
+    if manifest is not None:
+        save_cache_manifest(manifest)
     
     print(f"\n{'='*60}")
     print(f"TOTAL AMOUNT ACROSS ALL RECEIPTS: ${total_all_amount:.2f}")
     print('='*60)
 
-def process_all_files():
-    """Process all CSV files and create filtered receipts automatically."""
+def _analyze_file_captured(file_path, verbosity=0, metrics_log=None, rules=None):
+    """
+    Analyze one statement in a worker process with the parent's expense rules.
+    Returns its total, the captured console output, the metrics record and the dedup keys.
+    """
+    configure_instrumentation(verbosity, metrics_log or '')
+    configure_rules(rules)
+    output = StringIO()
+    metrics = StatementMetrics(file_path)
+    keys = []
+    with redirect_stdout(output):
+        amount = analyze_tool_expenses(file_path, metrics=metrics, keys=keys)
+    return file_path, amount, output.getvalue(), metrics.to_dict(), keys
+
+DEDUP_INDEX = '.epass_dedup.json'
+
+class DedupIndex:
+    """
+    Dedup keys (see transaction_keys) of the expensable transactions of every statement
+    processed so far, in processing order, persisted across runs in DEDUP_INDEX.
+    A transaction whose key already appeared in an earlier statement comes from an overlapping
+    or re-downloaded export and is a duplicate; repeats within one statement are kept.
+    Entries are tied to the statement's content hash and the rules, so changed statements are re-keyed.
+    """
+    def __init__(self, path=DEDUP_INDEX):
+        self.path = path
+        try:
+            with open(path, 'r') as file:
+                self.files = json.load(file).get('files', {})
+        except (OSError, ValueError):
+            self.files = {}
+    
+    def is_current(self, file_path, file_hash):
+        """Whether the statement is indexed with its current content and rules."""
+        entry = self.files.get(file_path)
+        return entry is not None and entry['hash'] == file_hash and entry['rules'] == _rules_fingerprint()
+    
+    def record(self, file_path, file_hash, keys):
+        """Index (or re-index, keeping its place in the order) a statement's transaction keys."""
+        self.files[file_path] = {'hash': file_hash, 'rules': _rules_fingerprint(), 'keys': list(keys)}
+    
+    def prune(self, batch):
+        """
+        Forget statements outside this batch that were deleted, renamed or changed since they
+        were indexed, so only statements still on disk as indexed count as earlier statements.
+        """
+        for file_path in [file_path for file_path in self.files if file_path not in batch]:
+            try:
+                current = self.files[file_path]['hash'] == _file_hash(file_path)
+            except OSError:
+                current = False
+            if not current:
+                del self.files[file_path]
+    
+    def duplicate_keys(self, files=None):
+        """
+        {statement: Counter of its duplicate keys} for every indexed statement (or only those in
+        `files`, which are then the only ones counted as earlier statements), found in one pass
+        over the keys with a running count of each key, so the cost is linear in the number
+        of transactions.
+        """
+        seen = collections.Counter()
+        removed = {}
+        for file_path, entry in self.files.items():
+            if files is not None and file_path not in files:
+                continue
+            counts = collections.Counter(entry['keys'])
+            removed[file_path] = collections.Counter({key: min(occurrences, seen[key])
+                                                      for key, occurrences in counts.items() if seen[key]})
+            seen.update(counts)
+        return removed
+    
+    def duplicates(self):
+        """(count, cents) of the duplicate transactions of every indexed statement."""
+        return {file_path: (sum(keys.values()), sum(repeated * int(key.rsplit(',', 1)[1])
+                                                     for key, repeated in keys.items()))
+                for file_path, keys in self.duplicate_keys().items()}
+    
+    def save(self):
+        """Write the index atomically, like the cache manifest."""
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as file:
+            json.dump({'files': self.files}, file)
+        os.replace(temp_path, self.path)
+
+def remove_duplicate_transactions(amounts, file_keys, index_path=DEDUP_INDEX):
+    """
+    Index the keys of this batch's statements (file_keys holds the keys of the statements just
+    analyzed; cached statements missing from the index are re-keyed in memory), print how many
+    duplicates each statement had and return {statement: duplicate cents} to take off its total.
+    Indexed statements that are no longer on disk as indexed are pruned first.
+    """
+    index = DedupIndex(index_path)
+    index.prune(amounts)
+    for file_path in sorted(amounts):
+        file_hash = _file_hash(file_path)
+        if file_path in file_keys:
+            index.record(file_path, file_hash, file_keys[file_path])
+        elif not index.is_current(file_path, file_hash):
+            try:
+                index.record(file_path, file_hash, analyze_statement(file_path).expensable_keys())
+            except Exception as e:
+                print(f"Could not index {file_path} for deduplication: {str(e)}")
+    index.save()
+    
+    duplicates = index.duplicates()
+    removed = {}
+    for file_path in sorted(amounts):
+        count, cents = duplicates.get(file_path, (0, 0))
+        if count:
+            print(f"Removed {count} duplicate transaction(s) (${cents_to_dollars(cents):.2f}) from {file_path}, "
+                  f"already counted in an earlier statement")
+            removed[file_path] = cents
+    return removed
+
+def process_all_files(workers=None, use_cache=True, pipeline=True, dedup=True):
+    """
+    Process all CSV files and create filtered receipts automatically.
+    Statements are analyzed concurrently in a process pool of `workers` processes
+    (defaults to the CPU count; 1 processes them sequentially in this process).
+    A sequential run is pipelined unless pipeline is False: a reader thread parses the next
+    statement and a writer thread flushes output files while the current one is classified.
+    Each file's console output is collected and printed in sorted file order, and the
+    per-file metrics are merged into one batch metrics record.
+    With use_cache, statements whose content, outputs and rules are unchanged since the
+    last run are skipped and their totals taken from the cache manifest.
+    With dedup, transactions already counted in an earlier statement of this or a previous
+    run (see DedupIndex) are left out of the grand total and reported per file.
+    """
     # Find all CSV files that match the pattern (month_year.csv)
-    csv_files = glob.glob('[0-9]*_2025.csv')
+    csv_files = glob.glob(STATEMENT_PATTERN)
     
     if not csv_files:
         print("No CSV files found matching the pattern (month_year.csv).")
@@ -510,23 +2387,382 @@ def process_all_files():
     for file in csv_files:
         print(f"  - {file}")
     
-    total_amount = 0
+    manifest = load_cache_manifest() if use_cache else None
+    amounts = {}
+    metrics_records = []
+    pending_files = []
+    file_keys = {}
     for file_path in sorted(csv_files):
-        print(f"\n{'='*60}")
-        print(f"Processing: {file_path}")
-        print('='*60)
-        
-        # Create filtered receipt first
-        filtered_receipt_path = filter_receipt_file(file_path)
-        
-        # Then analyze the original file for expensable transactions
-        amount = analyze_tool_expenses(file_path)
-        total_amount += amount
+        cached_total = _cached_statement_total(manifest, file_path) if manifest is not None else None
+        if cached_total is None:
+            pending_files.append(file_path)
+        else:
+            amounts[file_path] = cached_total
+    if amounts:
+        print(f"\nSkipping {len(amounts)} unchanged files (using cached totals)")
+    
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(pending_files)))
+    
+    if workers == 1 and pipeline and len(pending_files) > 1:
+        writer = BackgroundWriter()
+        try:
+            for file_path, statement, metrics in prefetch_statements(pending_files):
+                print(f"\n{'='*60}")
+                print(f"Processing: {file_path}")
+                print('='*60)
+                
+                file_keys[file_path] = []
+                amounts[file_path] = analyze_tool_expenses(file_path, metrics=metrics, statement=statement,
+                                                           write=writer, keys=file_keys[file_path])
+                metrics_records.append(metrics.to_dict())
+        finally:
+            # Outputs must be on disk before they are hashed into the manifest
+            writer.close()
+    elif workers == 1:
+        for file_path in pending_files:
+            print(f"\n{'='*60}")
+            print(f"Processing: {file_path}")
+            print('='*60)
+            
+            # Analyze the file for expensable transactions; this also writes the filtered receipt
+            metrics = StatementMetrics(file_path)
+            file_keys[file_path] = []
+            amounts[file_path] = analyze_tool_expenses(file_path, metrics=metrics, keys=file_keys[file_path])
+            metrics_records.append(metrics.to_dict())
+    else:
+        print(f"\nProcessing with {workers} worker processes")
+        settings = ([VERBOSITY] * len(pending_files), [METRICS_LOG] * len(pending_files),
+                    [get_expense_rules()] * len(pending_files))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # map() yields results in submission order, so the report is deterministic
+            results = executor.map(_analyze_file_captured, pending_files, *settings)
+            for file_path, amount, output, metrics_record, keys in results:
+                print(f"\n{'='*60}")
+                print(f"Processing: {file_path}")
+                print('='*60)
+                print(output, end='')
+                amounts[file_path] = amount
+                metrics_records.append(metrics_record)
+                file_keys[file_path] = keys
+    
+    if metrics_records:
+        emit_metrics(StatementMetrics.aggregate(metrics_records))
+    
+    if manifest is not None:
+        for file_path in pending_files:
+            _record_statement(manifest, file_path, amounts[file_path])
+        save_cache_manifest(manifest)
+    
+    # Sum exact cents in sorted file order so the total does not depend on which files were cached
+    total_cents = 0
+    for file_path in sorted(amounts):
+        total_cents += round(amounts[file_path] * 100)
+    
+    if dedup:
+        total_cents -= sum(remove_duplicate_transactions(amounts, file_keys).values())
+    total_amount = cents_to_dollars(total_cents)
     
     print(f"\n{'='*60}")
     print(f"TOTAL EXPENSABLE AMOUNT ACROSS ALL FILES: ${total_amount:.2f}")
     print('='*60)
 
+ROLLUP_PERIODS = ('month', 'quarter', 'year')
+
+def _statement_period(file_path, period):
+    """(sort key, label) of the month, quarter or year a month_year.csv statement belongs to."""
+    month, year = (int(part) for part in os.path.splitext(os.path.basename(file_path))[0].split('_'))
+    if period == 'month':
+        return (year, month), f"{calendar.month_name[month]} {year}"
+    if period == 'quarter':
+        quarter = (month - 1) // 3 + 1
+        return (year, quarter), f"Q{quarter} {year}"
+    if period == 'year':
+        return (year,), str(year)
+    raise ValueError(f"Unknown period {period!r}; expected one of {', '.join(ROLLUP_PERIODS)}")
+
+def rollup_summaries(summaries, period='quarter'):
+    """
+    Merge statement summaries into one per month, quarter or year, in O(number of summaries).
+    Returns [(label, StatementSummary)] in period order.
+    """
+    periods = {}
+    for summary in summaries:
+        key, label = _statement_period(summary.files[0], period)
+        periods.setdefault(key, (label, StatementSummary()))[1].merge(summary)
+    return [periods[key] for key in sorted(periods)]
+
+def period_reports(period='quarter', directory='.', report_path=None, report_format=None):
+    """
+    Render a summary-only expense report for every month, quarter or year from the persisted
+    statement summaries in directory, without parsing any statement.
+    Summaries of statements no longer in directory are skipped, and transactions already
+    counted in an earlier statement (see DedupIndex) are taken off, so the period totals
+    agree with the grand total of processing all files. A summary is matched with its index
+    entry by the statement hash stored in it, so no statement is read.
+    Returns [(label, StatementSummary)] in period order.
+    """
+    summaries = []
+    for path in sorted(glob.glob(os.path.join(directory, 'summary_*.json'))):
+        try:
+            summary = StatementSummary.load(path)
+            _statement_period(summary.files[0], period)
+        except (OSError, ValueError, KeyError, IndexError) as e:
+            print(f"Skipping {path}: {str(e)}")
+            continue
+        if not os.path.exists(os.path.join(directory, summary.files[0])):
+            print(f"Skipping {path}: {summary.files[0]} no longer exists")
+            continue
+        summaries.append(summary)
+    if not summaries:
+        print("No statement summaries found; process the statements first.")
+        return []
+    
+    index = DedupIndex(os.path.join(directory, DEDUP_INDEX))
+    current = {summary.files[0] for summary in summaries if index.is_current(summary.files[0], summary.statement_hash)}
+    duplicates = index.duplicate_keys(current)
+    for summary in summaries:
+        if duplicates.get(summary.files[0]):
+            summary.remove_duplicates(duplicates[summary.files[0]], index.files[summary.files[0]]['keys'])
+    
+    rollups = rollup_summaries(summaries, period)
+    fmt = report_format or _report_format_for(report_path)
+    write_report(''.join(summary.render_report(f"Toll Expense Report for {label} ({len(summary.files)} statements)", fmt)
+                         for label, summary in rollups), report_path)
+    return rollups
+
+TRANSACTION_STORE = 'epass_transactions.sqlite'
+STORE_COLUMNS = ['source_file', 'transponder', 'date', 'time', 'posting_date', 'location',
+                 'amount_cents', 'toll_type', 'weekday', 'is_holiday', 'is_expensable']
+# Columns computed on read; amounts are stored as exact integer cents
+DERIVED_STORE_COLUMNS = {'amount': 'amount_cents / 100.0 AS amount'}
+
+def _connect_store(store_path):
+    """Open the transaction store, creating the table and its indexes on first use."""
+    connection = sqlite3.connect(store_path)
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS transactions (
+            source_file TEXT NOT NULL,
+            transponder TEXT,
+            date TEXT NOT NULL,
+            time TEXT,
+            posting_date TEXT,
+            location TEXT,
+            amount_cents INTEGER,
+            toll_type TEXT,
+            weekday INTEGER,
+            is_holiday INTEGER,
+            is_expensable INTEGER
+        )
+    """)
+    connection.execute("CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions (date)")
+    connection.execute("CREATE INDEX IF NOT EXISTS idx_transactions_location ON transactions (location, date)")
+    connection.execute("CREATE INDEX IF NOT EXISTS idx_transactions_source ON transactions (source_file)")
+    return connection
+
+def ingest_statement(file_path, store_path=TRANSACTION_STORE):
+    """
+    Parse a statement and store its cleaned, classified transactions in the SQLite transaction store.
+    Re-ingesting a statement replaces its previous rows. Returns the number of rows stored.
+    """
+    statement = parse_statement(file_path)
+    if statement is None:
+        return 0
+    df = statement.df
+    rules = get_expense_rules().compile_for(df['Date'])
+    
+    rows = pd.DataFrame({
+        'source_file': os.path.basename(file_path),
+        'transponder': df['Transponder Number'].astype(str),
+        'date': df['Date'].dt.strftime('%Y-%m-%d'),
+        'time': format_time_of_day(df['Time']),
+        'posting_date': df['Posting Date'].astype(str),
+        'location': df['Location'].astype(str),
+        'amount_cents': df['Amount'].astype('int64'),
+        'toll_type': df['Toll Type'].astype(str),
+        'weekday': df['Date'].dt.dayofweek,
+        'is_holiday': rules.holiday_calendar.is_holiday(df['Date']).astype(int),
+        'is_expensable': rules.mask(df).astype(int),
+    })
+    
+    connection = _connect_store(store_path)
+    try:
+        with connection:
+            connection.execute("DELETE FROM transactions WHERE source_file = ?", (os.path.basename(file_path),))
+            rows.to_sql('transactions', connection, if_exists='append', index=False)
+    finally:
+        connection.close()
+    print(f"Stored {len(rows)} transactions from {file_path} in {store_path}")
+    return len(rows)
+
+def ingest_all_files(store_path=TRANSACTION_STORE):
+    """Ingest every month_year.csv statement into the transaction store."""
+    csv_files = glob.glob(STATEMENT_PATTERN)
+    if not csv_files:
+        print("No CSV files found matching the pattern (month_year.csv).")
+        return 0
+    total_rows = 0
+    for file_path in sorted(csv_files):
+        total_rows += ingest_statement(file_path, store_path)
+    print(f"\nStored {total_rows} transactions from {len(csv_files)} files in {store_path}")
+    return total_rows
+
+def query_transactions(columns=None, start_date=None, end_date=None, location=None,
+                       transponder=None, expensable=None, store_path=TRANSACTION_STORE):
+    """
+    Query the transaction store without re-parsing any statement.
+    Only the requested columns are read; dates are inclusive 'YYYY-MM-DD' bounds and
+    location matches with SQL LIKE (e.g. '%PLAZA%'). Amounts come back as exact integer
+    amount_cents; 'amount' gives them in dollars for display. Returns a DataFrame.
+    """
+    columns = columns or STORE_COLUMNS
+    unknown = [column for column in columns if column not in STORE_COLUMNS and column not in DERIVED_STORE_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown store columns: {', '.join(unknown)}")
+    
+    conditions = []
+    params = []
+    if start_date is not None:
+        conditions.append("date >= ?")
+        params.append(str(start_date))
+    if end_date is not None:
+        conditions.append("date <= ?")
+        params.append(str(end_date))
+    if location is not None:
+        conditions.append("location LIKE ?")
+        params.append(location)
+    if transponder is not None:
+        conditions.append("transponder = ?")
+        params.append(str(transponder))
+    if expensable is not None:
+        conditions.append("is_expensable = ?")
+        params.append(int(bool(expensable)))
+    
+    query = f"SELECT {', '.join(DERIVED_STORE_COLUMNS.get(column, column) for column in columns)} FROM transactions"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY date, time" if 'date' in columns and 'time' in columns else ""
+    
+    connection = _connect_store(store_path)
+    try:
+        return pd.read_sql_query(query, connection, params=params)
+    finally:
+        connection.close()
+
+WATCH_INTERVAL_SECONDS = 2.0
+STATEMENT_PATTERN = '[0-9]*_[0-9][0-9][0-9][0-9].csv'
+YTD_TOTAL_FILE = 'ytd_totals.csv'
+
+def _statement_signatures(pattern=STATEMENT_PATTERN):
+    """(mtime, size) of every statement in the current directory."""
+    signatures = {}
+    for file_path in glob.glob(pattern):
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            continue  # removed between the glob and the stat
+        signatures[file_path] = (stat.st_mtime_ns, stat.st_size)
+    return signatures
+
+def write_ytd_totals(amounts, ytd_path=YTD_TOTAL_FILE, duplicates=None):
+    """
+    Write the running expensable total of each year, from {statement: total}, as a small CSV.
+    duplicates ({statement: cents}, see remove_duplicate_transactions) is taken off the totals
+    so they agree with the grand total of processing all files.
+    Written atomically so readers never see a half written file.
+    """
+    duplicates = duplicates or {}
+    years = {}
+    for file_path in sorted(amounts):
+        year = get_report_period(file_path)[1]
+        cents, count = years.get(year, (0, 0))
+        years[year] = (cents + round(amounts[file_path] * 100) - duplicates.get(file_path, 0), count + 1)
+    lines = ["Year,Statements,Total Expensable\n"]
+    lines.extend(f"{year},{count},{cents_to_dollars(cents):.2f}\n" for year, (cents, count) in sorted(years.items()))
+    temp_path = ytd_path + '.tmp'
+    with open(temp_path, 'w') as file:
+        file.write(''.join(lines))
+    os.replace(temp_path, ytd_path)
+    return {year: cents_to_dollars(cents) for year, (cents, _) in years.items()}
+
+def watch_directory(directory='.', interval=WATCH_INTERVAL_SECONDS, use_inotify=True, iterations=None):
+    """
+    Watch a statement directory and process new or modified statements as they arrive,
+    keeping this process (and pandas) warm between statements. Outputs are written into
+    the watched directory, along with a running per-year total in ytd_totals.csv.
+    Statements already present are processed (or taken from the cache manifest) on start.
+    When polling, a statement is picked up once it is unchanged for one interval so
+    half-copied files are not read; with inotify_simple installed, a closed or moved-in
+    file is picked up straight away. Transactions repeated across statements are left out of
+    the running totals, as when processing all files (see DedupIndex).
+    Runs until interrupted, or for `iterations` checks; the working directory is restored on return.
+    """
+    previous_directory = os.getcwd()
+    os.chdir(directory)
+    notifier = None
+    if use_inotify and INotify is not None:
+        notifier = INotify()
+        notifier.add_watch('.', inotify_flags.CLOSE_WRITE | inotify_flags.MOVED_TO
+                           | inotify_flags.MOVED_FROM | inotify_flags.DELETE)
+    print(f"Watching {os.getcwd()} for statements ({'inotify' if notifier else 'polling'}, Ctrl+C to stop)")
+    
+    manifest = load_cache_manifest()
+    amounts = {}
+    processed = {}
+    observed = _statement_signatures()  # statements present at start count as complete
+    closed = set()
+    checks = 0
+    try:
+        while iterations is None or checks < iterations:
+            checks += 1
+            file_keys = {}
+            current = _statement_signatures()
+            ready = sorted(file_path for file_path, signature in current.items()
+                           if processed.get(file_path) != signature
+                           and (observed.get(file_path) == signature or file_path in closed))
+            removed = [file_path for file_path in amounts if file_path not in current]
+            observed = current
+            
+            for file_path in removed:
+                print(f"\nStatement removed: {file_path}")
+                del amounts[file_path]
+                processed.pop(file_path, None)
+            for file_path in ready:
+                started = time.perf_counter()
+                amount = _cached_statement_total(manifest, file_path)
+                if amount is None:
+                    print(f"\n{'='*60}")
+                    print(f"Processing: {file_path}")
+                    print('='*60)
+                    file_keys[file_path] = []
+                    amount = analyze_tool_expenses(file_path, keys=file_keys[file_path])
+                    _record_statement(manifest, file_path, amount)
+                    save_cache_manifest(manifest)
+                    print(f"Processed {file_path} in {(time.perf_counter() - started) * 1000:.0f} ms")
+                amounts[file_path] = amount
+                processed[file_path] = current[file_path]
+            
+            if ready or removed:
+                duplicates = remove_duplicate_transactions(amounts, file_keys)
+                for year, total in sorted(write_ytd_totals(amounts, duplicates=duplicates).items()):
+                    print(f"Year-to-date expensable total for {year}: ${total:.2f}")
+            
+            if iterations is not None and checks >= iterations:
+                break
+            if notifier is not None:
+                events = notifier.read(timeout=int(interval * 1000))
+                closed = {event.name for event in events}
+            else:
+                time.sleep(interval)
+    except KeyboardInterrupt:
+        print("\nStopped watching.")
+    finally:
+        if notifier is not None:
+            notifier.close()
+        os.chdir(previous_directory)
+    return amounts
+
 def get_csv_file():
     # Find all CSV files in the current directory
     csv_files = glob.glob('*.csv')
@@ -543,13 +2779,17 @@ def get_csv_file():
     # Ask user to select a file
     while True:
         try:
-            choice = input("\nEnter the number of the file you want to process (or 'q' to quit, 'all' to process all, 'totals' to add totals to receipts): ")
+            choice = input("\nEnter the number of the file you want to process (or 'q' to quit, 'all' to process all, 'totals' to add totals to receipts, 'ingest' to store all in the transaction store, 'watch' to watch this folder for new statements): ")
             if choice.lower() == 'q':
                 return None
             elif choice.lower() == 'all':
                 return 'ALL'
             elif choice.lower() == 'totals':
                 return 'TOTALS'
+            elif choice.lower() == 'ingest':
+                return 'INGEST'
+            elif choice.lower() == 'watch':
+                return 'WATCH'
             
             choice_idx = int(choice) - 1
             if 0 <= choice_idx < len(csv_files):
@@ -563,13 +2803,65 @@ def get_csv_file():
         except ValueError:
             print("Please enter a valid number.")
 
-if __name__ == "__main__":
-    file_name = get_csv_file()
-    if file_name == 'ALL':
-        process_all_files()
-    elif file_name == 'TOTALS':
+def main(argv=None):
+    """
+    Command line entry point. Statements given as arguments are analyzed without prompting;
+    with no arguments the interactive file prompt (get_csv_file) is shown.
+    """
+    parser = argparse.ArgumentParser(description="Separate expensable work-hour E-Pass tolls from personal ones.")
+    parser.add_argument('files', nargs='*', help="statements to analyze")
+    action = parser.add_mutually_exclusive_group()
+    action.add_argument('--all', action='store_true', help="process every statement in the current directory")
+    action.add_argument('--totals', action='store_true', help="add totals to all receipt files")
+    action.add_argument('--ingest', action='store_true', help="store all statements in the transaction store")
+    action.add_argument('--watch', metavar='DIR', help="watch a folder for new statements")
+    action.add_argument('--rollup', choices=ROLLUP_PERIODS,
+                        help="report per month, quarter or year from the saved statement summaries")
+    parser.add_argument('--report', metavar='PATH', help="write the report to PATH (.txt, .md or .html)")
+    parser.add_argument('--summary-only', action='store_true', help="leave out the transaction listings")
+    parser.add_argument('--streaming', action='store_true', default=None, help="force bounded-memory streaming mode")
+    parser.add_argument('--no-fast-path', dest='fast_path', action='store_false', default=None,
+                        help="always use the pandas path, even for small statements")
+    parser.add_argument('--workers', type=int, metavar='N',
+                        help="with --all, worker processes (default: CPU count; 1 runs the pipelined sequential mode)")
+    parser.add_argument('--no-pipeline', dest='pipeline', action='store_false',
+                        help="with --all --workers 1, process strictly in sequence without background I/O")
+    args = parser.parse_args(argv)
+    batch = args.all or args.totals or args.ingest or args.watch
+    if batch and (args.report or args.summary_only):
+        parser.error("--report and --summary-only apply to the statements given as arguments, "
+                     "not to --all, --totals, --ingest or --watch")
+    if args.report and len(args.files) > 1:
+        parser.error("--report takes a single statement; each statement would overwrite the same report")
+    
+    if args.all:
+        process_all_files(workers=args.workers, pipeline=args.pipeline)
+    elif args.totals:
         add_totals_to_all_receipts()
-    elif file_name:
-        analyze_tool_expenses(file_name)
+    elif args.ingest:
+        ingest_all_files()
+    elif args.watch:
+        watch_directory(args.watch)
+    elif args.rollup:
+        period_reports(args.rollup, report_path=args.report)
+    elif args.files:
+        for file_path in args.files:
+            analyze_tool_expenses(file_path, streaming=args.streaming, report_path=args.report,
+                                  summary_only=args.summary_only, fast_path=args.fast_path)
     else:
-        print("No file selected. Exiting.")
\ No newline at end of file
+        file_name = get_csv_file()
+        if file_name == 'ALL':
+            process_all_files()
+        elif file_name == 'TOTALS':
+            add_totals_to_all_receipts()
+        elif file_name == 'INGEST':
+            ingest_all_files()
+        elif file_name == 'WATCH':
+            watch_directory()
+        elif file_name:
+            analyze_tool_expenses(file_name)
+        else:
+            print("No file selected. Exiting.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+Parity tests for the standard-library fast path (analyze_small_statement) against the pandas
+path of analyze_tool_expenses: both must give the same totals, dedup keys, reports and
+output files, and statements the fast path does not handle must fall back to pandas.
+
+    python -m pytest -q test_fast_path_parity.py
+"""
+import contextlib
+import filecmp
+import io
+import os
+import shutil
+import subprocess
+import sys
+from datetime import date
+
+import pytest
+
+import benchmark_epass
+import epass_work_expense_analyzer as analyzer
+
+ACCOUNT_SECTION = (f"{analyzer.ACCOUNT_SECTION}\n"
+                   "Date,Description,Amount\n"
+                   '"01-Jan-25","Auto Replenishment","-40.00"\n'
+                   '"---------","---------","---------"\n'
+                   "\n")
+
+def row(transponder='3857335', day='06-Jan-25', time='08:15:00', location='CONWAY MAIN PLAZA', amount='1.25',
+        toll_type='E', posting='07-Jan-25', quote='"'):
+    """One Vehicle Activity line, quoted like an E-Pass export unless quote is ''."""
+    fields = [transponder, day, time, posting, location, amount, toll_type]
+    return ','.join(f"{quote}{field}{quote}" for field in fields) + '\n'
+
+# A working week, a weekend, early and late tolls and two transponders
+WEEK = [
+    row(day='06-Jan-25', time='07:29:59'),
+    row(day='06-Jan-25', time='07:30:00', location='DEAN ROAD', amount='0.75'),
+    row(day='07-Jan-25', time='12:00:00', transponder='4012876', amount='2.06'),
+    row(day='08-Jan-25', time='19:59:59', location='BOGGY CREEK', amount='1.56'),
+    row(day='09-Jan-25', time='20:00:01', amount='1.03'),
+    row(day='10-Jan-25', time='17:45:12', transponder='4012876', location='JOHN YOUNG PKWY', toll_type='V'),
+    row(day='11-Jan-25', time='10:00:00', amount='2.75'),
+    row(day='12-Jan-25', time='09:00:00', transponder='4012876'),
+]
+
+def write_statement(path, rows, account=True, newline='\n'):
+    with open(path, 'w', newline=newline) as file:
+        file.write((ACCOUNT_SECTION if account else '') + f"{analyzer.VEHICLE_SECTION}\n"
+                   + f"{analyzer.VEHICLE_HEADER}\n" + benchmark_epass.SEPARATOR_ROW + ''.join(rows))
+    return path
+
+# Statements the fast path handles itself
+FAST_STATEMENTS = {
+    'week': dict(rows=WEEK),
+    'quoted_commas': dict(rows=WEEK + [row(location='ORLANDO, FL PLAZA'), row(location='A, B, C', amount='0.50')]),
+    'negative_amounts': dict(rows=WEEK + [row(amount='-1.25'), row(day='07-Jan-25', amount='-0.05'),
+                                          row(day='08-Jan-25', amount='0.00')]),
+    'holidays': dict(rows=WEEK + [row(day='01-Jan-25'), row(day='20-Jan-25', amount='1.31'),
+                                  row(day='25-Dec-25', posting='26-Dec-25'), row(day='24-Dec-25')]),
+    'four_digit_years': dict(rows=[row(day='06-Jan-2025', posting='07-Jan-2025'), row(day='07-Jan-2025')] + WEEK),
+    'unquoted': dict(rows=[row(quote='', day=day) for day in ('06-Jan-25', '07-Jan-25', '11-Jan-25')]),
+    'padded_fields': dict(rows=WEEK + [row(location=' CURRY FORD WEST ', transponder=' 4012876')]),
+    'windows_line_endings': dict(rows=WEEK, newline='\r\n'),
+    'no_vehicle_rows': dict(rows=[]),
+}
+
+# Statements with something only the pandas parser handles
+FALLBACK_STATEMENTS = {
+    'no_account_section': dict(rows=WEEK, account=False),
+    'na_location': dict(rows=WEEK + [row(location='N/A')]),
+    'empty_amount': dict(rows=WEEK + [row(amount='')]),
+    'single_digit_hour': dict(rows=WEEK + [row(time='9:05:00')]),
+    'one_decimal_amount': dict(rows=WEEK + [row(amount='1.5')]),
+    'dollar_sign_amount': dict(rows=WEEK + [row(amount='$1.25')]),
+    'invalid_date': dict(rows=WEEK + [row(day='31-Feb-25')]),
+    'numeric_month': dict(rows=WEEK + [row(day='2025-01-08')]),
+    'extra_column': dict(rows=WEEK + [row().rstrip('\n') + ',"X"\n']),
+}
+
+@pytest.fixture(autouse=True)
+def default_rules():
+    analyzer.configure_rules(None)
+    yield
+    analyzer.configure_rules(None)
+
+def output_files(directory):
+    """Output file name -> contents, for every file written next to the statement."""
+    files = {}
+    for path in benchmark_epass._output_files(directory):
+        with open(os.path.join(directory, path), 'rb') as file:
+            files[path] = file.read()
+    return files
+
+def run(statement, directory, **kwargs):
+    """Run analyze_tool_expenses on a copy of the statement in directory; returns (total, stdout, keys, files)."""
+    os.makedirs(directory)
+    shutil.copy(statement, directory)
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        keys = []
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            total = analyzer.analyze_tool_expenses(os.path.basename(statement), streaming=False, keys=keys, **kwargs)
+    finally:
+        os.chdir(cwd)
+    return total, output.getvalue(), keys, output_files(directory)
+
+def assert_same_results(statement, workdir, **kwargs):
+    fast = run(statement, os.path.join(workdir, 'fast'), fast_path=True, **kwargs)
+    pandas = run(statement, os.path.join(workdir, 'pandas'), fast_path=False, **kwargs)
+    assert fast[0] == pandas[0]
+    assert fast[1] == pandas[1]
+    assert fast[2] == pandas[2]
+    assert fast[3].keys() == pandas[3].keys()
+    for path in pandas[3]:
+        assert fast[3][path] == pandas[3][path], path
+    return pandas
+
+def takes_fast_path(statement, workdir):
+    """Whether analyze_small_statement handles the statement; it must write nothing when it does not."""
+    directory = os.path.join(workdir, 'probe')
+    os.makedirs(directory)
+    shutil.copy(statement, directory)
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            total = analyzer.analyze_small_statement(os.path.basename(statement))
+    finally:
+        os.chdir(cwd)
+    if total is None:
+        assert output_files(directory) == {}
+    shutil.rmtree(directory)
+    return total is not None
+
+@pytest.mark.parametrize('case', sorted(FAST_STATEMENTS))
+def test_fast_path_matches_pandas_path(case, tmp_path):
+    statement = write_statement(tmp_path / '01_2025.csv', **FAST_STATEMENTS[case])
+    assert takes_fast_path(statement, tmp_path)
+    total, output, _, files = assert_same_results(statement, tmp_path)
+    assert 'TOTAL' in files['expensable_01_2025.csv'].decode()
+    assert 'Toll Expense Report for January 2025' in output
+
+@pytest.mark.parametrize('case', sorted(FALLBACK_STATEMENTS))
+def test_fallback_statements_match_pandas_path(case, tmp_path):
+    statement = write_statement(tmp_path / '01_2025.csv', **FALLBACK_STATEMENTS[case])
+    assert not takes_fast_path(statement, tmp_path)
+    assert_same_results(statement, tmp_path)
+
+@pytest.mark.parametrize('rows', [50, 1500])
+def test_generated_statements(rows, tmp_path):
+    statement = benchmark_epass.generate_statement(str(tmp_path / '12_2024.csv'), rows,
+                                                   start=date(2024, 11, 20), seed=rows)
+    assert takes_fast_path(statement, tmp_path)
+    total, _, keys, _ = assert_same_results(statement, tmp_path)
+    assert total > 0 and keys
+
+@pytest.mark.parametrize('report_name, summary_only', [('report.md', False), ('report.html', False),
+                                                       ('report.txt', True)])
+def test_report_formats(report_name, summary_only, tmp_path):
+    statement = write_statement(tmp_path / '01_2025.csv', **FAST_STATEMENTS['holidays'])
+    fast = run(statement, tmp_path / 'fast', fast_path=True, report_path=report_name, summary_only=summary_only)
+    pandas = run(statement, tmp_path / 'pandas', fast_path=False, report_path=report_name, summary_only=summary_only)
+    assert filecmp.cmp(tmp_path / 'fast' / report_name, tmp_path / 'pandas' / report_name, shallow=False)
+    assert fast[1] == pandas[1]
+    assert fast[3] == pandas[3]
+
+def test_custom_rules(tmp_path):
+    analyzer.configure_rules({
+        'windows': {'Monday': ['06:00', '22:00'], 'Saturday': ['09:00', '12:00']},
+        'christmas': False,
+        'holidays': {'2025-01-07': 'Company Day'},
+        'exceptions': [{'start': '2025-01-08', 'end': '2025-01-09', 'expensable': False, 'reason': 'PTO'}],
+        'transponders': {'4012876': {'windows': {'Sunday': ['08:00', '10:00']}}},
+    })
+    statement = write_statement(tmp_path / '01_2025.csv', **FAST_STATEMENTS['holidays'])
+    assert takes_fast_path(statement, tmp_path)
+    _, output, _, _ = assert_same_results(statement, tmp_path)
+    assert '[Company Day]' in output
+
+@pytest.mark.parametrize('case', ['unquoted', 'quoted_commas', 'padded_fields'])
+def test_streaming_receipts_keep_raw_lines(case, tmp_path):
+    statement = write_statement(tmp_path / '01_2025.csv', **FAST_STATEMENTS[case])
+    pandas = run(statement, tmp_path / 'pandas', fast_path=False)[3]
+    os.makedirs(tmp_path / 'stream')
+    shutil.copy(statement, tmp_path / 'stream')
+    cwd = os.getcwd()
+    os.chdir(tmp_path / 'stream')
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            analyzer.analyze_tool_expenses_streaming('01_2025.csv', chunksize=3)
+    finally:
+        os.chdir(cwd)
+    stream = output_files(tmp_path / 'stream')
+    receipts = [path for path in pandas if 'receipt_' in path]
+    assert receipts
+    for path in receipts:
+        assert stream[path] == pandas[path], path
+
+def test_leap_day_holiday_in_other_years(tmp_path):
+    analyzer.configure_rules({'holidays': {'02-29': 'Leap Day'}})
+    statement = write_statement(tmp_path / '01_2025.csv', **FAST_STATEMENTS['week'])
+    total, output, _, _ = assert_same_results(statement, tmp_path)
+    assert total > 0 and 'Error' not in output
+
+def test_fast_path_reports_write_errors(tmp_path, capsys):
+    write_statement(tmp_path / '01_2025.csv', **FAST_STATEMENTS['week'])
+    (tmp_path / 'receipt_01_2025.csv').mkdir()
+    cwd = os.getcwd()
+    os.chdir(tmp_path)
+    try:
+        assert analyzer.analyze_small_statement('01_2025.csv') == 0
+    finally:
+        os.chdir(cwd)
+    assert 'Error processing file' in capsys.readouterr().out
+
+def test_fast_path_does_not_import_pandas(tmp_path):
+    write_statement(tmp_path / '01_2025.csv', **FAST_STATEMENTS['holidays'])
+    script = ("import sys, epass_work_expense_analyzer as analyzer\n"
+              "assert analyzer.analyze_tool_expenses('01_2025.csv') is not None\n"
+              "print('pandas' in sys.modules)\n")
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(analyzer.__file__)))
+    result = subprocess.run([sys.executable, '-c', script], cwd=tmp_path, env=env, capture_output=True, text=True,
+                            check=True)
+    assert result.stdout.splitlines()[-1] == 'False'